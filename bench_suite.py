@@ -0,0 +1,393 @@
+"""Benchmarks and regression checks for decoding, tracking and rep extraction.
+
+Usage:
+    python bench_suite.py [--output bench_suite.json] [--baseline old.json] [--workdir dir]
+                          [--recorded file.squatter|dir ...]
+
+Renders synthetic videos (see synth_video.py) for a set of scenarios, and for every one of them
+measures sequential decoding speed, random seek time (and whether seeks land on the right
+frame), tracking speed and drift from ground truth, and speed of extract_reps, RepDetector and
+_trunc_rep on a long track. Reps extracted from tracked windows have to match ground truth, and
+reps found by RepDetector have to match extract_reps.
+
+extract_reps also has to match the original, frame by frame implementation (kept here as
+_reference_extract_reps) on the long tracks, on random tracks, and on tracks recorded from real
+videos given with --recorded.
+
+Results are written as JSON. With --baseline, timings are also compared with results of an
+earlier run, and anything slower by more than --max-slowdown counts as a failure. Exits with 1
+if there were any failures.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import squatter_file
+import synth_video
+import video_index
+from frame_capture import FrameCapture
+from track_squat import extract_reps, RepDetector, _trunc_rep
+
+_SCENARIOS = [
+    {"name": "squat_480p", "exercise": "squat", "size": (640, 480), "fps": 30},
+    {"name": "squat_1080p_60fps_noise", "exercise": "squat", "size": (1920, 1080), "fps": 60,
+     "noise": 6.0, "drift": 10.0},
+    {"name": "deadlift_720p_occlusion", "exercise": "deadlift", "size": (1280, 720),
+     "fps": 30, "occlusions": [(40, 50)]},
+    {"name": "deadlift_rotated", "exercise": "deadlift", "size": (720, 1280), "fps": 30,
+     "rotation": 90},
+]
+# Rep boundaries can be this far outside of ground truth ranges, and still count as correct.
+_REP_TOLERANCE_SECS = 0.2
+_N_SEEKS = 30
+# Rep extraction is timed on ground truth track repeated up to this many frames.
+_LONG_TRACK_FRAMES = 100000
+# Short timings are the best of this many runs, to keep noise out of comparisons.
+_N_TIMING_RUNS = 5
+# Number of random tracks that extract_reps is compared with the reference implementation on.
+_N_RANDOM_TRACKS = 3000
+# Timings compared with baseline, and whether higher values are better.
+_TIMINGS = {
+    "decode_fps": True,
+    "seek_ms": False,
+    "track_fps": True,
+    "extract_reps_ms": False,
+    "stream_reps_us_per_frame": False,
+    "trunc_rep_ms": False,
+}
+
+def _reps_match(reps, rep_ranges, tolerance):
+    if len(reps) != len(rep_ranges):
+        return False
+    return all(
+        lo - tolerance <= v <= hi + tolerance
+        for rep, ranges in zip(reps, rep_ranges) for v, (lo, hi) in zip(rep, ranges))
+
+def _reference_cm(track_window):
+    return (track_window[0] + track_window[2]/2, track_window[1] + track_window[3]/2)
+
+def _reference_sq_distance(cm1, cm2):
+    return (cm1[0]-cm2[0])**2 + (cm1[1]-cm2[1])**2
+
+def _reference_reps(track_windows, coeff):
+    """Rep extraction as it was before it was vectorized, that extract_reps has to match."""
+    reps = []
+    min_squat_distance = coeff*track_windows[0][3]
+    min_back_range = 0.5*track_windows[0][3]
+    cms = [_reference_cm(w) for w in track_windows]
+
+    idx = 0
+    while idx < len(cms):
+        min_cm = cms[idx]
+        min_idx = idx
+        max_cm = cms[idx]
+        max_idx = idx
+        while True:
+            if idx >= len(cms):
+                break
+            cur_cm = cms[idx]
+            if cur_cm[1] >= max_cm[1]:
+                max_cm = cur_cm
+                max_idx = idx
+
+            if (max_cm[1] <= min_cm[1] + min_squat_distance) and (cur_cm[1] <= min_cm[1]):
+                min_cm = cur_cm
+                min_idx = idx
+
+            if ((max_cm[1] > min_cm[1] + min_squat_distance) and
+                (cur_cm[1] < min_cm[1] + min_back_range)):
+                end_dst = _reference_sq_distance(cur_cm, min_cm)
+                end_idx = idx
+                idx += 1
+                while idx < len(cms):
+                    cur_cm = cms[idx]
+                    if cur_cm[1] > min_cm[1] + 2*min_back_range:
+                        break
+                    cur_dst = _reference_sq_distance(cur_cm, min_cm)
+                    if cur_dst <= end_dst:
+                        end_dst = cur_dst
+                        end_idx = idx
+                    idx += 1
+                reps.append([min_idx, max_idx, end_idx])
+                idx = end_idx
+                break
+            idx += 1
+    return reps
+
+def _reference_trunc_rep(track_windows, start_p=0.0, end_p=1.0):
+    if not track_windows: return 0, 0
+    cms = [_reference_cm(w) for w in track_windows]
+    start_dist = _reference_sq_distance(cms[-1], cms[0]) * start_p
+    end_dist = _reference_sq_distance(cms[-1], cms[0]) * end_p
+    start_idx = 0
+    for idx, cm in enumerate(cms):
+        if _reference_sq_distance(cms[0], cm) <= start_dist:
+            start_idx = idx
+        if _reference_sq_distance(cms[0], cm) >= end_dist:
+            return start_idx, idx
+    assert False, "Unreachable Code!"
+
+def _reference_extract_reps(exercise, track_windows):
+    track_windows = [tuple(float(v) for v in w) for w in track_windows]
+    if not track_windows: return []
+    if exercise == "squat":
+        return [
+            [min_idx, max_idx, max_idx + _reference_trunc_rep(
+                track_windows[max_idx:end_idx], end_p=0.90)[1]]
+            for min_idx, max_idx, end_idx in _reference_reps(track_windows, 2.0)]
+    track_windows = [(w[0], -w[1], w[2], w[3]) for w in track_windows]
+    return [
+        [min_idx + _reference_trunc_rep(
+            track_windows[min_idx:max_idx], start_p=0.01, end_p=0.95)[0], max_idx, end_idx]
+        for min_idx, max_idx, end_idx in _reference_reps(track_windows, 1.25)]
+
+def _random_track(rng):
+    """Random walk of a window, with plateaus and occasional changes of its size."""
+    n = rng.randint(1, 400)
+    ys = np.cumsum(rng.randn(n) * rng.choice([1, 5, 20]))
+    if rng.rand() < 0.5:
+        ys = np.round(ys / 10) * 10
+    hs = np.full(n, 40.0)
+    if rng.rand() < 0.3:
+        hs += rng.randint(0, 3, n)
+    return np.stack([rng.randn(n) * 3, ys, np.full(n, 40.0), hs], axis=1)
+
+def check_reference_random():
+    """Compares extract_reps with the reference implementation on random tracks."""
+    rng = np.random.RandomState(0)
+    n_mismatches = 0
+    n_reps = 0
+    for _ in range(_N_RANDOM_TRACKS):
+        windows = _random_track(rng)
+        for exercise in ("squat", "deadlift"):
+            reps = extract_reps(exercise, windows)
+            n_reps += len(reps)
+            if reps != _reference_extract_reps(exercise, windows):
+                n_mismatches += 1
+    return {"n_tracks": _N_RANDOM_TRACKS, "n_reps": n_reps, "reference_reps_ok": not n_mismatches}
+
+def _find_recorded(paths):
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        for dirpath, _, filenames in os.walk(path):
+            files.extend(
+                os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith(".squatter"))
+    return files
+
+def check_reference_recorded(path):
+    """Compares extract_reps with the reference implementation on a recorded .squatter file,
+    for both exercises.
+    """
+    data = squatter_file.load(path)
+    windows = np.asarray(data.track_windows, dtype=np.float64)
+    reps = {e: extract_reps(e, windows) for e in ("squat", "deadlift")}
+    return {
+        "n_frames": len(windows),
+        "n_reps": len(reps[data.exercise]),
+        "reference_reps_ok": all(
+            reps[e] == _reference_extract_reps(e, windows) for e in reps),
+    }
+
+def _checksum(frame):
+    return int(frame[::16, ::16].sum())
+
+def bench_decode(path):
+    cap = FrameCapture(path)
+    try:
+        cap.set_index(video_index.build(path, cap.rotate(), proxy=False))
+        checksums = []
+        t_start = time.time()
+        frame = cap._cap.read_at(0)
+        while frame is not None:
+            checksums.append(_checksum(frame))
+            frame = cap._cap.read()
+        decode_secs = time.time() - t_start
+
+        rng = np.random.RandomState(0)
+        seeks = rng.randint(0, len(checksums), _N_SEEKS)
+        exact = True
+        t_start = time.time()
+        for frame_n in seeks:
+            frame = cap._cap.read_at(int(frame_n))
+            exact = exact and frame is not None and _checksum(frame) == checksums[frame_n]
+        seek_secs = time.time() - t_start
+    finally:
+        cap.release()
+    return {
+        "n_frames": len(checksums),
+        "decode_fps": len(checksums) / decode_secs,
+        "seek_ms": 1000.0 * seek_secs / _N_SEEKS,
+        "seek_exact": exact,
+    }
+
+def bench_track(path, gt):
+    cap = FrameCapture(path)
+    try:
+        x, y, w, h = gt.windows[0]
+        t_start = time.time()
+        cap.track_start(x, y, w, h, 0)
+        while cap.track_next() is not None:
+            pass
+        secs = time.time() - t_start
+        windows = np.asarray(cap._track_windows, dtype=np.float64)
+    finally:
+        cap.release()
+    gt_windows = np.asarray(gt.windows, dtype=np.float64)[:len(windows)]
+    drift = np.sqrt(((
+        (windows[:, :2] + windows[:, 2:] / 2) -
+        (gt_windows[:, :2] + gt_windows[:, 2:] / 2)) ** 2).sum(axis=1))
+    reps = extract_reps(gt.exercise, windows)
+    return {
+        "n_tracked": len(windows),
+        "track_fps": len(windows) / secs,
+        "drift_mean": float(drift.mean()),
+        "drift_max": float(drift.max()),
+        "reps": reps,
+        "reps_ok": _reps_match(
+            reps, gt.rep_ranges, int(round(_REP_TOLERANCE_SECS * gt.fps))),
+    }
+
+def _best_time(f):
+    """Returns (best time in seconds of a few runs of f, its result)."""
+    best = None
+    for _ in range(_N_TIMING_RUNS):
+        t_start = time.time()
+        result = f()
+        secs = time.time() - t_start
+        best = secs if best is None else min(best, secs)
+    return best, result
+
+def _stream_reps(exercise, windows):
+    detector = RepDetector(exercise)
+    reps = []
+    for window in windows:
+        reps.extend(detector.add(window))
+    reps.extend(detector.finish())
+    return reps
+
+def bench_reps(gt):
+    n_repeats = max(1, _LONG_TRACK_FRAMES // len(gt.windows))
+    windows = np.tile(np.asarray(gt.windows, dtype=np.float64), (n_repeats, 1))
+    extract_secs, reps = _best_time(lambda: extract_reps(gt.exercise, windows))
+    trunc_secs, _ = _best_time(lambda: _trunc_rep(windows))
+    t_start = time.time()
+    stream_reps = _stream_reps(gt.exercise, windows)
+    stream_secs = time.time() - t_start
+    return {
+        "extract_reps_ms": 1000.0 * extract_secs,
+        "trunc_rep_ms": 1000.0 * trunc_secs,
+        "stream_reps_us_per_frame": 1e6 * stream_secs / len(windows),
+        "stream_reps_ok": stream_reps == reps,
+        "long_track_reps_ok": len(reps) == n_repeats * len(gt.reps),
+        "reference_reps_ok": reps == _reference_extract_reps(gt.exercise, windows),
+        "gt_reps_ok": _reps_match(
+            extract_reps(gt.exercise, gt.windows), gt.rep_ranges,
+            int(round(_REP_TOLERANCE_SECS * gt.fps))),
+    }
+
+def run_scenario(scenario, workdir):
+    path = os.path.join(workdir, scenario["name"] + ".mp4")
+    try:
+        gt = synth_video.render(
+            path, scenario["exercise"], 3, scenario["size"], scenario["fps"],
+            scenario.get("rotation", 0), scenario.get("noise", 0.0),
+            scenario.get("occlusions", ()), scenario.get("drift", 0.0))
+    except RuntimeError as e:
+        return {"skipped": str(e)}
+    result = {}
+    result.update(bench_decode(path))
+    result.update(bench_track(path, gt))
+    result.update(bench_reps(gt))
+    return result
+
+def _failures(name, result, baseline, max_slowdown):
+    failures = []
+    for check in ("seek_exact", "reps_ok", "gt_reps_ok", "long_track_reps_ok",
+                  "stream_reps_ok", "reference_reps_ok"):
+        if check in result and not result[check]:
+            failures.append("{}: {} failed".format(name, check))
+    base = (baseline or {}).get(name, {})
+    for key, higher_is_better in sorted(_TIMINGS.items()):
+        if key not in result or not base.get(key):
+            continue
+        slowdown = base[key] / result[key] if higher_is_better else result[key] / base[key]
+        if slowdown > max_slowdown:
+            failures.append("{}: {} {:.2f} vs baseline {:.2f} ({:.2f}x slower)".format(
+                name, key, result[key], base[key], slowdown))
+    return failures
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark and regression suite.")
+    parser.add_argument("--output", default="bench_suite.json")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare timings with.")
+    parser.add_argument("--max-slowdown", type=float, default=1.25)
+    parser.add_argument("--workdir", help="Where to keep rendered videos, temporary if not set.")
+    parser.add_argument("--scenarios", help="Comma separated names of scenarios to run.")
+    parser.add_argument("--recorded", nargs="*", default=[],
+            help=".squatter files (or directories with them) of real videos, to compare "
+                 "extract_reps with the reference implementation on.")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.loads(f.read())["scenarios"]
+    scenarios = _SCENARIOS
+    if args.scenarios:
+        names = args.scenarios.split(",")
+        scenarios = [s for s in _SCENARIOS if s["name"] in names]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="squatter_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    results = {}
+    failures = []
+    try:
+        for scenario in scenarios:
+            name = scenario["name"]
+            result = run_scenario(scenario, workdir)
+            results[name] = result
+            if "skipped" in result:
+                print("{:<28} skipped: {}".format(name, result["skipped"]))
+                continue
+            print("{:<28} decode {:7.1f} fps  seek {:6.1f} ms  track {:7.1f} fps  "
+                  "drift {:5.2f}  reps {:6.1f} ms".format(
+                      name, result["decode_fps"], result["seek_ms"], result["track_fps"],
+                      result["drift_mean"], result["extract_reps_ms"]))
+            failures.extend(_failures(name, result, baseline, args.max_slowdown))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    reference_checks = [("random_tracks", check_reference_random)]
+    reference_checks.extend(
+        (path, lambda path=path: check_reference_recorded(path))
+        for path in _find_recorded(args.recorded))
+    for name, check in reference_checks:
+        result = check()
+        results[name] = result
+        print("{:<28} reps {:5d}  reference {}".format(
+            name, result["n_reps"], "ok" if result["reference_reps_ok"] else "MISMATCH"))
+        failures.extend(_failures(name, result, None, args.max_slowdown))
+
+    for failure in failures:
+        print("FAILED", failure)
+    with open(args.output, "w") as f:
+        f.write(json.dumps({
+            "opencv": cv2.__version__,
+            "scenarios": results,
+            "failures": failures,
+        }, indent=4))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,134 @@
+"""Compares tracker backends for speed and accuracy on reference videos.
+
+Usage:
+    python bench_trackers.py reference.json [--trackers medianflow,kcf] [--output bench.json]
+
+reference.json is a JSON list of objects with keys "video" and optionally "ground_truth",
+path to a .squatter file with verified track windows (defaults to video's own .squatter
+file). Tracking is seeded with the first ground truth window, and for every tracker reports
+frames per second, drift of track window centers from ground truth (in pixels), number of
+videos where tracker got lost, and number of videos where extract_reps finds different reps.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import squatter_file
+import trackers
+import video_index
+from frame_capture import FrameCapture
+from track_squat import extract_reps
+
+# Rep boundaries can differ by this many frames from ground truth, and still count as same.
+_REP_TOLERANCE = 3
+
+def _load_references(path):
+    with open(path, "r") as f:
+        entries = json.loads(f.read())
+    base_dir = os.path.dirname(os.path.abspath(path))
+    refs = []
+    for e in entries:
+        video = os.path.join(base_dir, e["video"])
+        gt_path = e.get("ground_truth")
+        gt_path = os.path.join(base_dir, gt_path) if gt_path else squatter_file.squatter_path(video)
+        gt = squatter_file.load(gt_path)
+        assert gt is not None, "Missing ground truth: {}".format(gt_path)
+        refs.append((video, gt))
+    return refs
+
+def _same_reps(reps, gt_reps):
+    if len(reps) != len(gt_reps):
+        return False
+    return all(
+        abs(a - b) <= _REP_TOLERANCE
+        for rep, gt_rep in zip(reps, gt_reps) for a, b in zip(rep, gt_rep))
+
+def bench_video(video, gt, tracker, capture_kwargs):
+    cap = FrameCapture(video, index=video_index.load(video), tracker=tracker, **capture_kwargs)
+    try:
+        gt_windows = np.asarray(gt.track_windows, dtype=np.float64)
+        x, y, w, h = gt_windows[0]
+        t_start = time.time()
+        cap.track_start(x, y, w, h, gt.first_frame)
+        while len(cap._track_windows) < len(gt_windows) and cap.track_next() is not None:
+            pass
+        secs = time.time() - t_start
+        windows = np.asarray(cap._track_windows, dtype=np.float64)
+    finally:
+        cap.release()
+
+    n = len(windows)
+    cms = windows[:, :2] + windows[:, 2:] / 2
+    gt_cms = gt_windows[:n, :2] + gt_windows[:n, 2:] / 2
+    drift = np.sqrt(((cms - gt_cms) ** 2).sum(axis=1))
+    return {
+        "video": video,
+        "tracker": tracker,
+        "n_frames": n,
+        "fps": n / secs if secs > 0 else 0.0,
+        "drift_mean": float(drift.mean()),
+        "drift_max": float(drift.max()),
+        "lost": n < len(gt_windows),
+        "reps_ok": _same_reps(
+            extract_reps(gt.exercise, windows), extract_reps(gt.exercise, gt_windows)),
+    }
+
+def summarize(results):
+    summary = {}
+    for tracker in sorted(set(r["tracker"] for r in results)):
+        rs = [r for r in results if r["tracker"] == tracker and "error" not in r]
+        n_frames = sum(r["n_frames"] for r in rs)
+        secs = sum(r["n_frames"] / r["fps"] for r in rs if r["fps"] > 0)
+        summary[tracker] = {
+            "fps": n_frames / secs if secs > 0 else 0.0,
+            "drift_mean": float(np.mean([r["drift_mean"] for r in rs])) if rs else None,
+            "drift_max": max(r["drift_max"] for r in rs) if rs else None,
+            "lost": sum(1 for r in rs if r["lost"]),
+            "bad_reps": sum(1 for r in rs if not r["reps_ok"]),
+            "errors": sum(1 for r in results if r["tracker"] == tracker and "error" in r),
+        }
+    return summary
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark tracker backends.")
+    parser.add_argument("reference", help="JSON list of reference videos.")
+    parser.add_argument("--trackers", default=",".join(trackers.tracker_names()))
+    parser.add_argument("--track-level", type=int, default=0)
+    parser.add_argument("--track-roi", type=float)
+    parser.add_argument("--output", default="bench_trackers.json")
+    args = parser.parse_args(argv)
+
+    refs = _load_references(args.reference)
+    capture_kwargs = {"track_level": args.track_level, "track_roi": args.track_roi}
+    results = []
+    for tracker in args.trackers.split(","):
+        for video, gt in refs:
+            try:
+                results.append(bench_video(video, gt, tracker, capture_kwargs))
+            except Exception as e:
+                results.append({
+                    "video": video, "tracker": tracker,
+                    "error": "{}: {}".format(type(e).__name__, e)})
+                print("FAILED", tracker, video, results[-1]["error"])
+
+    summary = summarize(results)
+    print("{:<12} {:>8} {:>10} {:>10} {:>5} {:>9} {:>7}".format(
+        "tracker", "fps", "drift", "max drift", "lost", "bad reps", "errors"))
+    for tracker, s in sorted(summary.items(), key=lambda kv: -kv[1]["fps"]):
+        if s["drift_mean"] is None:
+            print("{:<12} {:>8} {:>10} {:>10} {:>5} {:>9} {:>7}".format(
+                tracker, "-", "-", "-", "-", "-", s["errors"]))
+            continue
+        print("{:<12} {:>8.1f} {:>10.2f} {:>10.2f} {:>5} {:>9} {:>7}".format(
+            tracker, s["fps"], s["drift_mean"], s["drift_max"],
+            s["lost"], s["bad_reps"], s["errors"]))
+    with open(args.output, "w") as f:
+        f.write(json.dumps({"summary": summary, "results": results}, indent=4))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
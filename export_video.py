@@ -0,0 +1,258 @@
+"""Renders tracking results onto the video, for sharing them.
+
+Usage:
+    python export_video.py video.mp4 [--output video.annotated.mp4] [--scale 0.5] [--fps 15]
+
+Every frame gets the track windows of all targets, the bar path of the current rep (red
+descent, green ascent, like in the app) and rep timings. Only the tracked part of the video is
+exported, unless --all is given. Decoding, drawing and encoding run on separate threads, so
+export is about as fast as the slowest of them.
+"""
+import argparse
+import bisect
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import media_probe
+import profiler
+import squatter_file
+import video_index
+from frame_capture import VideoReader
+from track_squat import extract_reps, rep_secs, _cms
+
+# Frames that can wait between pipeline stages.
+_QUEUE_SIZE = 16
+# Colors for tracked targets as BGR, same as in the app.
+_TARGET_COLORS = [(0, 0, 255), (255, 153, 0), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+_DESCENT_COLOR = (0, 0, 255)
+_ASCENT_COLOR = (0, 255, 0)
+
+def export_path(video_path):
+    return os.path.splitext(video_path)[0] + ".annotated.mp4"
+
+def _put(q, item, stop):
+    """Puts item into bounded queue, unless pipeline is being stopped. Returns False if it is."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
+
+class _Overlay(object):
+    """Draws tracking results onto frames of the exported video."""
+
+    def __init__(self, tracking_data, scale, video_fps):
+        """video_fps is used for rep times if tracking_data has no fps (older JSON files)."""
+        self._exercise = tracking_data.exercise
+        self._fps = tracking_data.fps or video_fps
+        self._first_frame = tracking_data.first_frame
+        self._scale = scale
+        self._target_windows = [
+            np.asarray(windows, dtype=np.float64) * scale
+            for windows in tracking_data.target_windows]
+        self._target_confidences = tracking_data.target_confidences
+        self._target_cms = [
+            np.round(_cms(windows)).astype(np.int32) for windows in self._target_windows]
+        self._reps = extract_reps(self._exercise, tracking_data.track_windows)
+        self._rep_starts = [rep[0] for rep in self._reps]
+
+    def _lift_end(self, rep):
+        return rep[2] if self._exercise == "squat" else rep[1]
+
+    def draw(self, frame, frame_n):
+        idx = frame_n - self._first_frame
+        if idx < 0 or idx >= len(self._target_windows[0]):
+            return frame
+        line_width = max(1, int(round(3 * self._scale)))
+        rep_n = bisect.bisect_right(self._rep_starts, idx) - 1
+        rep = self._reps[rep_n] if rep_n >= 0 else None
+        if rep is not None and idx <= rep[2]:
+            for target, cms in enumerate(self._target_cms[1:], 1):
+                cv2.polylines(
+                    frame, [cms[rep[0]:idx+1]], False,
+                    _TARGET_COLORS[target % len(_TARGET_COLORS)], 1, cv2.LINE_AA)
+            cms = self._target_cms[0]
+            bottom = min(idx, rep[1])
+            cv2.polylines(
+                frame, [cms[rep[0]:bottom+1]], False,
+                _DESCENT_COLOR if self._exercise == "squat" else _ASCENT_COLOR,
+                line_width, cv2.LINE_AA)
+            # Don't care about bar path going down during deadlifts.
+            if self._exercise == "squat" and idx > rep[1]:
+                cv2.polylines(
+                    frame, [cms[rep[1]:idx+1]], False, _ASCENT_COLOR, line_width, cv2.LINE_AA)
+
+        for target, windows in enumerate(self._target_windows):
+            x, y, w, h = (int(round(v)) for v in windows[idx])
+            width = line_width if self._target_confidences[target][idx] > 0 else 1
+            cv2.rectangle(
+                frame, (x, y), (x + w, y + h), _TARGET_COLORS[target % len(_TARGET_COLORS)],
+                width)
+
+        lines = []
+        for i, done in enumerate(self._reps[:rep_n+1]):
+            if idx >= self._lift_end(done) and self._fps:
+                lines.append("Rep {}  {:.2f}s".format(
+                    i + 1, rep_secs(self._exercise, done, self._fps)))
+            else:
+                lines.append("Rep {}".format(i + 1))
+        font_scale = max(0.4, frame.shape[0] / 720.0)
+        line_height = int(30 * font_scale)
+        for i, text in enumerate(lines):
+            pos = (line_height // 2, line_height * (i + 1))
+            cv2.putText(frame, text, pos, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0),
+                        line_width + 2, cv2.LINE_AA)
+            cv2.putText(frame, text, pos, cv2.FONT_HERSHEY_SIMPLEX, font_scale,
+                        (255, 255, 255), line_width, cv2.LINE_AA)
+        return frame
+
+def export(video_path, output_path, tracking_data=None, scale=1.0, fps=None, full=False,
+           progress=None):
+    """Writes annotated copy of the video to output_path. Returns number of frames written.
+
+    tracking_data is loaded from the video's .squatter file if not given. scale resizes frames,
+    fps lowers frame rate by skipping frames. Only the tracked frames are exported, unless
+    full is set. progress is called with (frames done, frames total) from the encoding thread.
+    """
+    if tracking_data is None:
+        tracking_data = squatter_file.load(squatter_file.squatter_path(video_path))
+        assert tracking_data is not None, "No .squatter file for {}".format(video_path)
+    rotate = max(media_probe.probe(video_path)["rotation"], 0) // 90
+    index = video_index.load(video_path)
+    reader = VideoReader(
+        video_path, rotate, index.timestamps if index is not None else None)
+    video_fps = reader.get(cv2.CAP_PROP_FPS) or tracking_data.fps
+    if full:
+        start, end = 0, int(reader.get(cv2.CAP_PROP_FRAME_COUNT))
+    else:
+        start = tracking_data.first_frame
+        end = start + len(tracking_data.track_windows)
+    out_fps = min(fps, video_fps) if fps else video_fps
+    n_total = int((end - start) * out_fps / video_fps)
+    overlay = _Overlay(tracking_data, scale, video_fps)
+
+    decoded = queue.Queue(maxsize=_QUEUE_SIZE)
+    drawn = queue.Queue(maxsize=_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+    n_written = [0]
+
+    def _decode():
+        reader.seek(start)
+        emitted = -1
+        for frame_n in range(start, end):
+            # Frames are kept whenever output clock ticks, others are only grabbed, not retrieved.
+            out_n = int((frame_n - start) * out_fps / video_fps)
+            if out_n == emitted:
+                if not reader.grab(): break
+                continue
+            frame = reader.read()
+            if frame is None: break
+            emitted = out_n
+            if not _put(decoded, (frame_n, frame), stop): return
+
+    def _draw():
+        while True:
+            item = _get(decoded, stop)
+            if item is None: break
+            frame_n, frame = item
+            with profiler.stage("draw"):
+                if scale != 1.0:
+                    frame = cv2.resize(
+                        frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)),
+                        interpolation=cv2.INTER_AREA)
+                frame = overlay.draw(frame, frame_n)
+            if not _put(drawn, frame, stop): return
+        _put(drawn, None, stop)
+
+    def _encode():
+        writer = None
+        try:
+            while True:
+                frame = _get(drawn, stop)
+                if frame is None: break
+                with profiler.stage("encode"):
+                    if writer is None:
+                        writer = cv2.VideoWriter(
+                            output_path, cv2.VideoWriter_fourcc(*"mp4v"), out_fps,
+                            (frame.shape[1], frame.shape[0]))
+                        assert writer.isOpened(), \
+                            "Failed to open video writer for {}".format(output_path)
+                    writer.write(frame)
+                n_written[0] += 1
+                if progress is not None:
+                    progress(n_written[0], n_total)
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def _run(f):
+        try:
+            f()
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    def _run_decode():
+        _run(_decode)
+        _put(decoded, None, stop)
+
+    threads = [
+        threading.Thread(target=_run_decode),
+        threading.Thread(target=_run, args=(_draw,)),
+        threading.Thread(target=_run, args=(_encode,)),
+    ]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        reader.release()
+    if errors:
+        raise errors[0]
+    return n_written[0]
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Export video annotated with tracking results.")
+    parser.add_argument("video")
+    parser.add_argument("--output", help="Defaults to <video>.annotated.mp4.")
+    parser.add_argument("--scale", type=float, default=1.0,
+            help="Resize frames by this factor, i.e. 0.5 for half resolution.")
+    parser.add_argument("--fps", type=float, help="Lower frame rate to this.")
+    parser.add_argument("--all", action="store_true",
+            help="Export the whole video, not only the tracked part.")
+    args = parser.parse_args(argv)
+
+    output = args.output or export_path(args.video)
+    def _progress(done, total):
+        if done % 100 == 0 or done == total:
+            sys.stdout.write("\r{}/{} frames".format(done, total))
+            sys.stdout.flush()
+    t_start = time.time()
+    n_frames = export(
+        args.video, output, scale=args.scale, fps=args.fps, full=args.all, progress=_progress)
+    print("\nExported {} frames to {} ({:.1f}s)".format(n_frames, output, time.time() - t_start))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,135 @@
+"""Strip of small thumbnails sampled evenly across a video, shown along the frame slider.
+
+Thumbnails are decoded by a background thread that only reads forward, grabbing frames in
+between without retrieving them (they are still decoded, grabbing only saves the color
+conversion and copy). First pass gets every few thumbnails, so that the whole strip
+can be shown early on (gaps show the nearest thumbnail), and the next one fills in the rest.
+Finished filmstrip is stored next to the video, and reused as long as the video is unchanged.
+"""
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frame_capture import VideoReader
+from video_index import _fingerprint
+
+FILMSTRIP_EXT = ".squatter-filmstrip.npz"
+N_THUMBS = 64
+THUMB_HEIGHT = 48
+# Every _COARSE_STEP-th thumbnail is decoded by the first pass.
+_COARSE_STEP = 4
+# Builder backs off for this long whenever the app is busy (playing, tracking...).
+_BUSY_SLEEP_SECS = 0.2
+
+class Filmstrip(object):
+
+    def __init__(self, frames, thumbs):
+        """frames are frame numbers of thumbnails, thumbs has a BGR image or None for each."""
+        self.frames = frames
+        self.thumbs = thumbs
+
+    def complete(self):
+        return all(thumb is not None for thumb in self.thumbs)
+
+    def strip(self, n):
+        """Returns (image, frame numbers) for n thumbnails picked evenly across the video, side
+        by side in a single image, or (None, None) if there are none yet. Missing thumbnails
+        are filled in with the nearest decoded one.
+        """
+        have = [i for i, thumb in enumerate(self.thumbs) if thumb is not None]
+        if not have: return None, None
+        n = max(1, min(n, len(self.thumbs)))
+        slots = [int((i + 0.5) * len(self.thumbs) / n) for i in range(n)]
+        nearest = [min(have, key=lambda j: abs(j - slot)) for slot in slots]
+        image = np.ascontiguousarray(np.hstack([self.thumbs[i] for i in nearest]))
+        return image, [self.frames[slot] for slot in slots]
+
+def _sample_frames(n_frames, n_thumbs):
+    n_thumbs = max(1, min(n_thumbs, n_frames))
+    return [int((i + 0.5) * n_frames / n_thumbs) for i in range(n_thumbs)]
+
+def load(video_path):
+    """Returns complete Filmstrip for the video, or None if it is missing or out of date."""
+    path = video_path + FILMSTRIP_EXT
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as d:
+        if json.loads(str(d["fingerprint"])) != _fingerprint(video_path):
+            return None
+        return Filmstrip([int(f) for f in d["frames"]], list(d["thumbs"]))
+
+def _save(video_path, filmstrip):
+    path = video_path + FILMSTRIP_EXT
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f, fingerprint=json.dumps(_fingerprint(video_path)),
+            frames=np.asarray(filmstrip.frames), thumbs=np.stack(filmstrip.thumbs))
+    os.replace(tmp_path, path)
+
+class FilmstripBuilder(threading.Thread):
+    """Builds and saves Filmstrip in the background.
+
+    on_update is called with the Filmstrip (from this thread) after every thumbnail. busy is
+    polled between frames, builder waits while it returns True, to stay out of the way.
+    """
+
+    def __init__(self, video_path, rotate, n_frames, on_update, index=None, busy=None,
+                 n_thumbs=N_THUMBS):
+        super(FilmstripBuilder, self).__init__()
+        self.daemon = True
+        self._video_path = video_path
+        # Proxy is already rotated, and much cheaper to decode.
+        if index is not None and index.proxy_path is not None:
+            self._reader_args = (index.proxy_path,)
+            n_frames = index.n_frames()
+        else:
+            self._reader_args = (video_path, rotate)
+        self._on_update = on_update
+        self._busy = busy
+        frames = _sample_frames(n_frames, n_thumbs)
+        self.filmstrip = Filmstrip(frames, [None] * len(frames))
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _wait_idle(self):
+        while self._busy is not None and self._busy() and not self._stop_event.is_set():
+            time.sleep(_BUSY_SLEEP_SECS)
+        return not self._stop_event.is_set()
+
+    def _pass(self, reader, slots):
+        """Reads forward from the start of the video, decoding only frames of given slots."""
+        reader.seek(0)
+        for slot in slots:
+            frame_n = self.filmstrip.frames[slot]
+            while reader.next_pos() is not None and reader.next_pos() < frame_n:
+                if not self._wait_idle(): return False
+                if not reader.grab(): return False
+            if not self._wait_idle(): return False
+            frame = reader.read()
+            if frame is None: return False
+            h, w = frame.shape[:2]
+            self.filmstrip.thumbs[slot] = cv2.resize(
+                frame, (max(1, w * THUMB_HEIGHT // h), THUMB_HEIGHT),
+                interpolation=cv2.INTER_AREA)
+            self._on_update(self.filmstrip)
+        return True
+
+    def run(self):
+        reader = VideoReader(*self._reader_args)
+        try:
+            n = len(self.filmstrip.frames)
+            coarse = list(range(0, n, _COARSE_STEP))
+            fine = [i for i in range(n) if i % _COARSE_STEP != 0]
+            for slots in (coarse, fine):
+                if not self._pass(reader, slots): break
+        finally:
+            reader.release()
+        if self.filmstrip.complete():
+            _save(self._video_path, self.filmstrip)
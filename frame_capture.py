@@ -0,0 +1,809 @@
+import bisect
+import collections
+import concurrent.futures
+import os
+import threading
+import time
+
+import cv2
+
+import media_probe
+import profiler
+import trackers
+from trackers import _gray
+
+# Default memory budget for decoded frames that are cached for the canvas.
+_CACHE_MB = 256
+# Number of frames around current canvas frame that are decoded in the background.
+_READ_AHEAD_BEHIND = 15
+_READ_AHEAD_AHEAD = 30
+# Attempts for frame accurate seeking, before settling for whatever frame decoder returns.
+_SEEK_RETRIES = 3
+# Frames that playback decodes ahead of the one being shown.
+_PLAYBACK_BUFFER = 12
+# How long a lost target is searched for, before tracking gives up on it.
+_RECOVER_SECS = 3.0
+# Search area around the last known window, in window sizes on each side. It starts at
+# _SEARCH_START and widens by _SEARCH_GROWTH with every frame that target stays lost.
+_SEARCH_START = 1.0
+_SEARCH_GROWTH = 0.25
+# Minimum match score with the seed patch, for a lost target to be considered found again.
+_REDETECT_MIN_SCORE = 0.6
+# Trackers that latch onto whatever covers the target tend to jump away or to grow or shrink
+# their window. Target counts as lost if its window moves more than _MAX_STEP window sizes in
+# a single frame, or its size changes by more than _MAX_SCALE_CHANGE times.
+_MAX_STEP = 2.0
+_MAX_SCALE_CHANGE = 2.0
+# Confidence of windows of frames that tracking skipped, because nothing moved in them.
+SKIPPED_CONFIDENCE = -1.0
+
+def _rotate_frame(frame, rotate):
+    if rotate == 0: return frame
+    with profiler.stage("rotate"):
+        for _ in range(rotate):
+            frame = cv2.flip(frame, 0)
+            frame = cv2.transpose(frame, 0)
+    return frame
+
+def _rotate_window(window, size, rotate):
+    """Maps window from a frame of given size, to coordinates of the frame after _rotate_frame."""
+    x, y, w, h = window
+    frame_w, frame_h = size
+    for _ in range(rotate):
+        x, y, w, h = frame_h - y - h, x, h, w
+        frame_w, frame_h = frame_h, frame_w
+    return (x, y, w, h)
+
+def _unrotate_window(window, size, rotate):
+    """Inverse of _rotate_window, size is the size of the frame before rotation."""
+    x, y, w, h = window
+    frame_w, frame_h = size
+    if rotate % 2 == 1:
+        frame_w, frame_h = frame_h, frame_w
+    for _ in range(rotate):
+        frame_w, frame_h = frame_h, frame_w
+        x, y, w, h = y, frame_h - x - w, h, w
+    return (x, y, w, h)
+
+def _fit_to_canvas(frame, canvas_size, orig_size=None):
+    """Returns (pos, resized frame, original frame size).
+
+    orig_size is the size of the source video frame, when frame is from a lower resolution proxy.
+    """
+    canvas_w, canvas_h = canvas_size
+    frame_w, frame_h = len(frame[0]), len(frame)
+    if orig_size is None:
+        orig_size = (frame_w, frame_h)
+    # Decide which way to resize the image, to keep aspect ratio intact.
+    if frame_w * canvas_h > frame_h * canvas_w:
+        frame_h = int(frame_h * canvas_w / frame_w)
+        frame_w = canvas_w
+        pos_x = 0
+        pos_y = (canvas_h - frame_h)/2
+    else:
+        frame_w = int(frame_w * canvas_h / frame_h)
+        frame_h = canvas_h
+        pos_x = (canvas_w - frame_w)/2
+        pos_y = 0
+    with profiler.stage("resize"):
+        frame = cv2.resize(frame, (frame_w, frame_h))
+    return (pos_x, pos_y), frame, orig_size
+
+
+class VideoReader(object):
+    """cv2.VideoCapture that applies rotation and avoids seeking when reading sequentially.
+
+    If timestamps from a VideoIndex are given, seeks are verified against them to be frame
+    accurate even for long GOP files.
+    """
+
+    def __init__(self, filename, rotate=0, timestamps=None):
+        self._cap = cv2.VideoCapture(filename)
+        self._cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        self._rotate = rotate
+        self._timestamps = timestamps
+        # Position of the next frame that read() returns, None if unknown.
+        self._next_pos = 0
+        # True if frame at _next_pos has been grabbed, but not retrieved yet.
+        self._grabbed = False
+
+    def release(self):
+        self._cap.release()
+
+    def get(self, prop):
+        return self._cap.get(prop)
+
+    def set_timestamps(self, timestamps):
+        self._timestamps = timestamps
+
+    def next_pos(self):
+        return self._next_pos
+
+    def grab(self):
+        if self._grabbed:
+            self._grabbed = False
+        elif not self._cap.grab():
+            self._next_pos = None
+            return False
+        if self._next_pos is not None:
+            self._next_pos += 1
+        return True
+
+    def read(self, rotated=True):
+        with profiler.stage("decode"):
+            if self._grabbed:
+                # Frame was already grabbed while seeking, it only needs to be retrieved.
+                self._grabbed = False
+                ret, frame = self._cap.retrieve()
+            else:
+                ret, frame = self._cap.read()
+        if not ret:
+            self._next_pos = None
+            return None
+        if self._next_pos is not None:
+            self._next_pos += 1
+        return _rotate_frame(frame, self._rotate) if rotated else frame
+
+    def read_at(self, frame_n, rotated=True):
+        # Seeking decodes from the previous key frame, skip it when reading sequentially.
+        if frame_n != self._next_pos:
+            self.seek(frame_n)
+        return self.read(rotated)
+
+    def seek(self, frame_n):
+        with profiler.stage("seek"):
+            self._seek(frame_n)
+
+    def _seek(self, frame_n):
+        self._grabbed = False
+        self._next_pos = frame_n
+        if self._timestamps is None or frame_n >= len(self._timestamps):
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_n)
+            return
+        seek_n = frame_n
+        for _ in range(_SEEK_RETRIES):
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, seek_n)
+            if not self._cap.grab(): break
+            pos = self._frame_at_msec(self._cap.get(cv2.CAP_PROP_POS_MSEC))
+            if pos > frame_n:
+                # Landed after the requested frame, need to seek further back.
+                seek_n = max(0, seek_n - 2 * (pos - frame_n))
+                continue
+            while pos < frame_n and self._cap.grab():
+                pos += 1
+            if pos == frame_n:
+                self._grabbed = True
+                return
+            break
+        print("WARNING: Failed to seek accurately!", frame_n)
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_n)
+
+    def _frame_at_msec(self, msec):
+        # Timestamps are in milliseconds, allow for rounding errors.
+        return bisect.bisect_left(self._timestamps, msec - 0.5)
+
+
+class FrameCache(object):
+    """Thread safe LRU cache of frames prepared for the canvas, bounded by memory use."""
+
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._frames = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._frames
+
+    def put(self, key, value, nbytes):
+        if nbytes > self._max_bytes: return
+        with self._lock:
+            if key in self._frames: return
+            self._frames[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self._max_bytes:
+                _, (_, evicted_bytes) = self._frames.popitem(last=False)
+                self._bytes -= evicted_bytes
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+
+
+class _ReadAhead(threading.Thread):
+    """Decodes frames around the last requested canvas frame, using its own reader."""
+
+    def __init__(self, reader, cache, orig_size=None):
+        super(_ReadAhead, self).__init__()
+        self.daemon = True
+        self._reader = reader
+        self._cache = cache
+        self._orig_size = orig_size
+        self._cond = threading.Condition()
+        self._request = None
+        self._stopped = False
+
+    def request(self, frame_n, canvas_size):
+        with self._cond:
+            self._request = (frame_n, canvas_size)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._request is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped: break
+                frame_n, canvas_size = self._request
+                self._request = None
+            self._fill(frame_n, canvas_size)
+        self._reader.release()
+
+    def _fill(self, frame_n, canvas_size):
+        start = max(0, frame_n - _READ_AHEAD_BEHIND)
+        end = frame_n + _READ_AHEAD_AHEAD
+        while start <= end and self._cache.contains((start,) + canvas_size):
+            start += 1
+        if start > end: return
+        if self._reader.next_pos() != start:
+            self._reader.seek(start)
+        for n in range(start, end + 1):
+            if self._request is not None or self._stopped:
+                # Slider has moved, no point in finishing this range.
+                return
+            key = (n,) + canvas_size
+            if self._cache.contains(key):
+                if not self._reader.grab(): return
+                continue
+            frame = self._reader.read()
+            if frame is None: return
+            value = _fit_to_canvas(frame, canvas_size, self._orig_size)
+            self._cache.put(key, value, value[1].nbytes)
+
+
+class Playback(threading.Thread):
+    """Decodes frames for playback in a background thread, into a small ring buffer.
+
+    Frames are due at wall clock times given by video fps and playback speed, starting when
+    the first frame is taken. Frames that would be late are dropped, if possible without
+    even decoding them.
+    """
+
+    def __init__(self, reader, cache, canvas_size, orig_size, start_frame, end_frame, fps,
+                 speed=1.0):
+        super(Playback, self).__init__()
+        self.daemon = True
+        self._reader = reader
+        self._cache = cache
+        self._canvas_size = canvas_size
+        self._orig_size = orig_size
+        self._start_frame = start_frame
+        self._end_frame = end_frame
+        self._frame_rate = (fps or 30.0) * speed
+        self._t0 = None
+        self._buffer = collections.deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._finished = False
+        self.dropped = 0
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def done(self):
+        """True once the last frame has been taken."""
+        with self._cond:
+            return self._finished and not self._buffer
+
+    def _frame_due(self):
+        if self._t0 is None: return self._start_frame
+        return self._start_frame + int((time.time() - self._t0) * self._frame_rate)
+
+    def run(self):
+        if self._reader.next_pos() != self._start_frame:
+            self._reader.seek(self._start_frame)
+        n = self._start_frame
+        while n < self._end_frame and not self._stopped:
+            if n < self._frame_due():
+                # Frame is already late, skip it without retrieving/converting it. grab() still
+                # decodes it, so this saves only the color conversion and copy.
+                if not self._reader.grab(): break
+                self.dropped += 1
+                n += 1
+                continue
+            frame = self._reader.read()
+            if frame is None: break
+            value = _fit_to_canvas(frame, self._canvas_size, self._orig_size)
+            # Frames go through the cache, so that canvas can show them like any other frame.
+            self._cache.put((n,) + self._canvas_size, value, value[1].nbytes)
+            with self._cond:
+                while len(self._buffer) >= _PLAYBACK_BUFFER and not self._stopped:
+                    self._cond.wait()
+                self._buffer.append(n)
+            n += 1
+        with self._cond:
+            self._finished = True
+        self._reader.release()
+
+    def next_frame(self):
+        """Returns number of the latest frame that is due, or None if no new frame is."""
+        with self._cond:
+            if self._t0 is None and self._buffer:
+                self._t0 = time.time()
+            due = self._frame_due()
+            frame_n = None
+            while self._buffer and self._buffer[0] <= due:
+                if frame_n is not None:
+                    self.dropped += 1
+                frame_n = self._buffer.popleft()
+            self._cond.notify()
+            return frame_n
+
+
+class FrameCapture(object):
+
+    def __init__(self, filename, frame_canvas=None, track_first_frame=None, track_windows=None,
+                 target_windows=None, cache_mb=_CACHE_MB, index=None, track_level=0, track_roi=None,
+                 tracker=trackers.DEFAULT_TRACKER, target_confidences=None,
+                 recover_secs=_RECOVER_SECS, skip_ranges=None):
+        """track_level is the pyramid level that tracking runs at, each level halves the
+        resolution. If track_roi is set, tracker only sees region around the last track
+        window, extending track_roi times the window size on each side. tracker is one of
+        trackers.tracker_names(). Targets that tracker loses are searched for up to
+        recover_secs, 0 stops tracking as soon as any target is lost. skip_ranges are [start, end)
+        frame ranges without motion (see motion_scan.static_ranges), that tracking skips.
+        """
+        # TODO(zviad): figure out how to make this work with PyInstaller.
+        rot_degree = media_probe.probe(filename)["rotation"]
+        self._rotate = max(rot_degree, 0) // 90
+        self._filename = filename
+        self._cap = VideoReader(filename, self._rotate)
+        self._frame_canvas = frame_canvas
+        self._frame_cache = FrameCache(cache_mb * 1024 * 1024)
+        self._read_ahead = None
+        # Where the frame was last laid out on the canvas, set by frame_for_canvas.
+        self._frame_pos = None
+        self._index = None
+        self._display_cap = self._cap
+        self._track_first_frame = track_first_frame
+        self._track_windows = track_windows
+        if target_windows is None and track_windows is not None:
+            target_windows = [track_windows]
+        self._target_windows = target_windows
+        if target_confidences is None and target_windows is not None:
+            target_confidences = [[1.0] * len(windows) for windows in target_windows]
+        self._target_confidences = target_confidences
+        self._recover_secs = recover_secs
+        self._skip_ranges = sorted(skip_ranges or [])
+        self._track_scale = 0.5 ** track_level
+        self._track_roi_margin = track_roi
+        self._tracker_name = tracker
+        self._track_pool = None
+        if index is not None:
+            self.set_index(index)
+
+    def release(self):
+        if self._track_pool is not None:
+            self._track_pool.shutdown()
+            self._track_pool = None
+        self._stop_read_ahead()
+        self._frame_cache.clear()
+        if self._display_cap is not self._cap:
+            self._display_cap.release()
+        self._cap.release()
+
+    def rotate(self):
+        return self._rotate
+
+    def set_index(self, index):
+        """Uses VideoIndex for accurate seeking, and its proxy (if any) for the canvas."""
+        self._index = index
+        self._cap.set_timestamps(index.timestamps)
+        if index.proxy_path is None or self._frame_canvas is None: return
+        self._stop_read_ahead()
+        self._frame_cache.clear()
+        if self._display_cap is not self._cap:
+            self._display_cap.release()
+        # Proxy is already rotated and every frame is a key frame in it.
+        self._display_cap = VideoReader(index.proxy_path)
+
+    def _stop_read_ahead(self):
+        if self._read_ahead is not None:
+            self._read_ahead.stop()
+            self._read_ahead.join()
+            self._read_ahead = None
+
+    def n_frames(self):
+        return int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def fps(self):
+        return self._cap.get(cv2.CAP_PROP_FPS)
+
+    def _display_orig_size(self):
+        if self._display_cap is self._cap: return None
+        return self._index.frame_size
+
+    def frame_for_canvas(self, frame_n, read_ahead=True):
+        canvas_size = (int(self._frame_canvas.width), int(self._frame_canvas.height))
+        key = (frame_n,) + canvas_size
+        cached = self._frame_cache.get(key)
+        if cached is None:
+            frame = self._display_cap.read_at(frame_n)
+            if frame is None: return None, None
+            cached = _fit_to_canvas(frame, canvas_size, self._display_orig_size())
+            self._frame_cache.put(key, cached, cached[1].nbytes)
+        frame_pos, frame, self._frame_orig_size = cached
+        self._frame_size = (len(frame[0]), len(frame))
+        self._frame_pos = frame_pos
+
+        if not read_ahead: return frame_pos, frame
+        if self._read_ahead is None:
+            self._read_ahead = _ReadAhead(
+                self._new_display_reader(), self._frame_cache, self._display_orig_size())
+            self._read_ahead.start()
+        self._read_ahead.request(frame_n, canvas_size)
+        return frame_pos, frame
+
+    def _new_display_reader(self):
+        if self._display_cap is self._cap:
+            timestamps = self._index.timestamps if self._index is not None else None
+            return VideoReader(self._filename, self._rotate, timestamps)
+        return VideoReader(self._index.proxy_path)
+
+    def start_playback(self, frame_n, speed=1.0):
+        """Starts Playback from frame_n, frames it returns are ready for frame_for_canvas."""
+        canvas_size = (int(self._frame_canvas.width), int(self._frame_canvas.height))
+        playback = Playback(
+            self._new_display_reader(), self._frame_cache, canvas_size,
+            self._display_orig_size(), frame_n, self.n_frames(), self.fps(), speed)
+        playback.start()
+        return playback
+
+    def n_targets(self):
+        return len(self._target_windows) if self._target_windows is not None else 0
+
+    def track_window_for_canvas(self, frame_n, target=0):
+        if self._track_first_frame is None:
+            return None
+        track_windows = self._target_windows[target]
+        if (frame_n < self._track_first_frame or
+                frame_n >= self._track_first_frame+len(track_windows)):
+            return None
+        track_window = track_windows[frame_n-self._track_first_frame]
+        canvas_track_window = (
+            int(track_window[0] * self._frame_size[0] / self._frame_orig_size[0]),
+            int(track_window[1] * self._frame_size[1] / self._frame_orig_size[1]),
+            int(track_window[2] * self._frame_size[0] / self._frame_orig_size[0]),
+            int(track_window[3] * self._frame_size[1] / self._frame_orig_size[1]))
+
+        canvas_track_window = (
+            self._frame_pos[0] + canvas_track_window[0],
+            self._frame_pos[1] + self._frame_size[1] -
+                canvas_track_window[1] - canvas_track_window[3], # Need to flip Y axis...
+            canvas_track_window[2],
+            canvas_track_window[3])
+        return canvas_track_window
+
+    def on_canvas(self):
+        """True once a frame has been laid out on the canvas."""
+        return self._frame_pos is not None
+
+    def canvas_xy_to_frame_xy(self, x, y):
+        frame_x = x - self._frame_pos[0]
+        if frame_x < 0 or frame_x >= self._frame_size[0]:
+            return None
+        frame_y = self._frame_pos[1] + self._frame_size[1] - y
+        if frame_y < 0 or frame_y >= self._frame_size[1]:
+            return None
+
+        frame_x = int(frame_x * self._frame_orig_size[0] / self._frame_size[0])
+        frame_y = int(frame_y * self._frame_orig_size[1] / self._frame_size[1])
+        return (frame_x, frame_y)
+
+    def frame_xy_to_canvas_xy(self, x, y):
+        """Inverse of canvas_xy_to_frame_xy. Only valid once a frame is on the canvas (see
+        on_canvas).
+        """
+        return (
+            self._frame_pos[0] + x * self._frame_size[0] / self._frame_orig_size[0],
+            self._frame_pos[1] + self._frame_size[1] -
+                y * self._frame_size[1] / self._frame_orig_size[1])
+
+    def track_start(self, x, y, w, h, frame_n):
+        self.track_start_multi([(x, y, w, h)], frame_n)
+
+    def track_start_multi(self, windows, frame_n):
+        """Starts tracking of several targets, that share decoding of every frame.
+
+        _track_windows are windows of the first target, _target_windows of all of them.
+        _target_confidences has a confidence for every window, 1.0 for tracked windows,
+        match score for windows where lost target was found again, 0.0 for windows
+        interpolated over frames where it was lost, and SKIPPED_CONFIDENCE for frames in
+        skip_ranges, that have the last tracked window.
+        """
+        # Tracking runs on frames as they are decoded, track windows are rotated instead.
+        frame = self._cap.read_at(frame_n, rotated=False)
+        assert frame is not None, "Frame number out of Bounds!"
+
+        raw_size = (len(frame[0]), len(frame))
+        max_lost = int(self._recover_secs * (self.fps() or 30.0))
+        self._track_first_frame = frame_n
+        self._targets = []
+        self._target_windows = []
+        self._target_confidences = []
+        for window in windows:
+            target = _Target(
+                self._tracker_name, raw_size, self._rotate,
+                self._track_scale, self._track_roi_margin, max_lost)
+            ok = target.start(frame, _unrotate_window(window, raw_size, self._rotate))
+            assert ok, "Failed to initialize tracker!"
+            self._targets.append(target)
+            self._target_windows.append([tuple(window)])
+            self._target_confidences.append([1.0])
+        self._track_windows = self._target_windows[0]
+        self._track_confidences = self._target_confidences[0]
+        # Results for frames since some target got lost, they are only added to
+        # _target_windows once all targets are found again.
+        self._pending = []
+        if len(self._targets) > 1 and self._track_pool is None:
+            # OpenCV releases GIL, so targets can be tracked in parallel with threads.
+            self._track_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(len(self._targets), os.cpu_count() or 1))
+
+    def track_resume(self, target_windows, target_confidences, first_frame):
+        """Continues tracking that was interrupted, from the last of target_windows.
+
+        Targets are still searched for with patches from the first frame if they get lost.
+        """
+        self.track_start_multi([windows[0] for windows in target_windows], first_frame)
+        last_frame = first_frame + len(target_windows[0]) - 1
+        frame = self._cap.read_at(last_frame, rotated=False)
+        assert frame is not None, "Frame number out of Bounds!"
+        raw_size = (len(frame[0]), len(frame))
+        for target, windows in zip(self._targets, target_windows):
+            window = tuple(float(v) for v in windows[-1])
+            ok = target.init(frame, _unrotate_window(window, raw_size, self._rotate))
+            assert ok, "Failed to initialize tracker!"
+        for t, (windows, confidences) in enumerate(zip(target_windows, target_confidences)):
+            self._target_windows[t][:] = [tuple(float(v) for v in w) for w in windows]
+            self._target_confidences[t][:] = [float(c) for c in confidences]
+
+    def track_next(self):
+        """Should be called until returns None.
+
+        While a target is lost, frames are still returned but windows aren't added until it
+        is found again, and then windows for all of these frames are added at once.
+        """
+        skip_end = self._skip_end()
+        if skip_end is not None:
+            frame = self._skip_to(skip_end)
+            if frame is None: return None
+            update = lambda t: t.reacquire(frame)
+        else:
+            frame = self._cap.read(rotated=False)
+            if frame is None: return None
+            update = lambda t: t.update(frame)
+        if len(self._targets) == 1:
+            results = [update(self._targets[0])]
+        else:
+            results = list(self._track_pool.map(update, self._targets))
+        if any(t.gave_up() for t in self._targets):
+            return None
+        self._pending.append(results)
+        if all(window is not None for window, _ in results):
+            self._add_pending()
+        return frame
+
+    def _skip_end(self):
+        """Returns end of skip range that the next frame starts, if all targets are found."""
+        if self._pending: return None
+        frame_n = self._track_first_frame + len(self._track_windows)
+        i = bisect.bisect_right(self._skip_ranges, (frame_n, float("inf"))) - 1
+        if i < 0: return None
+        start, end = self._skip_ranges[i]
+        return end if start <= frame_n < end else None
+
+    def _skip_to(self, end):
+        """Fills in windows up to end with the last ones, returns frame at end."""
+        with profiler.stage("skip"):
+            n_skipped = end - (self._track_first_frame + len(self._track_windows))
+            frame = self._cap.read_at(end, rotated=False)
+        if frame is None: return None
+        for windows, confidences in zip(self._target_windows, self._target_confidences):
+            windows.extend([windows[-1]] * n_skipped)
+            confidences.extend([SKIPPED_CONFIDENCE] * n_skipped)
+        return frame
+
+    def _add_pending(self):
+        for t, (target_windows, confidences) in enumerate(
+                zip(self._target_windows, self._target_confidences)):
+            pending = [results[t] for results in self._pending]
+            last = target_windows[-1]
+            windows = []
+            for i, (window, confidence) in enumerate(pending):
+                if window is None:
+                    # Next found window always exists, pending ends with all targets found.
+                    j = next(j for j in range(i + 1, len(pending)) if pending[j][0] is not None)
+                    found = pending[j][0]
+                    a = 1.0 / (j - i + 1)
+                    window = tuple(l + (f - l) * a for l, f in zip(last, found))
+                windows.append(window)
+                last = window
+            target_windows.extend(windows)
+            confidences.extend(confidence for _, confidence in pending)
+        self._pending = []
+
+    def track_confidence(self, frame_n, target=0):
+        if self._target_confidences is None: return None
+        i = frame_n - self._track_first_frame
+        confidences = self._target_confidences[target]
+        if i < 0 or i >= len(confidences): return None
+        return confidences[i]
+
+
+class _Target(object):
+    """Tracker of a single target, on downscaled region of frames around it."""
+
+    def __init__(self, tracker_name, raw_size, rotate, scale, roi_margin, max_lost):
+        self._tracker_name = tracker_name
+        self._raw_size = raw_size
+        self._rotate = rotate
+        self._scale = scale
+        self._roi_margin = roi_margin
+        self._max_lost = max_lost
+        self._n_lost = 0
+
+    def start(self, frame, raw_window):
+        """Like init, but also keeps seed patch, to find the target again if it gets lost."""
+        x, y, w, h = (int(round(v)) for v in raw_window)
+        self._seed = _gray(frame[max(y, 0):y+h, max(x, 0):x+w]).copy()
+        return self.init(frame, raw_window)
+
+    def init(self, frame, raw_window):
+        self._raw_window = raw_window
+        x, y, w, h = raw_window
+        if self._roi_margin is None:
+            self._roi = (0, 0, self._raw_size[0], self._raw_size[1])
+        else:
+            margin_w = w * (0.5 + self._roi_margin)
+            margin_h = h * (0.5 + self._roi_margin)
+            self._roi = (
+                max(0, int(x + w/2 - margin_w)),
+                max(0, int(y + h/2 - margin_h)),
+                min(self._raw_size[0], int(x + w/2 + margin_w) + 1),
+                min(self._raw_size[1], int(y + h/2 + margin_h) + 1))
+        self._tracker = trackers.create_tracker(self._tracker_name)
+        return self._tracker.init(self._track_image(frame), self._to_track_window(raw_window))
+
+    def _track_image(self, frame):
+        x0, y0, x1, y1 = self._roi
+        frame = frame[y0:y1, x0:x1]
+        if self._scale != 1.0:
+            frame = cv2.resize(
+                frame, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _to_track_window(self, window):
+        s = self._scale
+        return (
+            (window[0] - self._roi[0]) * s, (window[1] - self._roi[1]) * s,
+            window[2] * s, window[3] * s)
+
+    def _from_track_window(self, window):
+        s = self._scale
+        return (
+            window[0] / s + self._roi[0], window[1] / s + self._roi[1],
+            window[2] / s, window[3] / s)
+
+    def _near_roi_edge(self):
+        if self._roi_margin is None: return False
+        x, y, w, h = self._raw_window
+        x0, y0, x1, y1 = self._roi
+        min_w = w * self._roi_margin / 2
+        min_h = h * self._roi_margin / 2
+        return (
+            (x0 > 0 and x - x0 < min_w) or
+            (y0 > 0 and y - y0 < min_h) or
+            (x1 < self._raw_size[0] and x1 - (x + w) < min_w) or
+            (y1 < self._raw_size[1] and y1 - (y + h) < min_h))
+
+    def gave_up(self):
+        return self._n_lost > self._max_lost
+
+    def update(self, frame):
+        """Returns (track window in rotated frame coordinates, confidence), window is None
+        while target is lost.
+        """
+        if self._n_lost:
+            with profiler.stage("redetect"):
+                return self._redetect(frame)
+        with profiler.stage("track"):
+            ok, track_window = self._tracker.update(self._track_image(frame))
+        if ok:
+            ok = self._plausible(self._from_track_window(track_window))
+        if not ok:
+            self._n_lost = 1
+            if self.gave_up():
+                print("Tracker no longer available!", track_window)
+            return None, 0.0
+        self._raw_window = self._from_track_window(track_window)
+        if self._near_roi_edge():
+            # Re-center region around the target, tracker needs to start over with it.
+            ok = self.init(frame, self._raw_window)
+            assert ok, "Failed to re-initialize tracker!"
+        return _rotate_window(self._raw_window, self._raw_size, self._rotate), 1.0
+
+    def reacquire(self, frame):
+        """Like update, after frames were skipped. Target is searched for around its last
+        window, and tracker starts over from where it is found.
+        """
+        with profiler.stage("redetect"):
+            found = self._match(frame, _SEARCH_START)
+        if found is not None:
+            return found
+        # Seed patch doesn't match (i.e. lighting changed), nothing moved so tracker can
+        # carry on from where it was.
+        return self.update(frame)
+
+    def _plausible(self, raw_window):
+        x, y, w, h = raw_window
+        last_x, last_y, last_w, last_h = self._raw_window
+        seed_h, seed_w = self._seed.shape
+        scale = max(w / seed_w, h / seed_h)
+        step = max(abs(x + w/2 - last_x - last_w/2), abs(y + h/2 - last_y - last_h/2))
+        return (
+            1.0 / _MAX_SCALE_CHANGE < scale < _MAX_SCALE_CHANGE and
+            step <= _MAX_STEP * max(last_w, last_h))
+
+    def _redetect(self, frame):
+        """Searches for seed patch around the last known window, in area that widens with
+        every frame that target stays lost.
+        """
+        found = self._match(frame, _SEARCH_START + _SEARCH_GROWTH * (self._n_lost - 1))
+        if found is not None:
+            self._n_lost = 0
+            return found
+        self._n_lost += 1
+        if self.gave_up():
+            print("Tracker no longer available!", self._raw_window)
+        return None, 0.0
+
+    def _match(self, frame, pad):
+        """Returns (window, score) where seed patch matches best, within pad window sizes
+        around the last known window, and starts tracker there. None if it doesn't match.
+        """
+        x, y, w, h = self._raw_window
+        x0, y0 = max(0, int(x - w * pad)), max(0, int(y - h * pad))
+        x1 = min(self._raw_size[0], int(x + w * (1 + pad)) + 1)
+        y1 = min(self._raw_size[1], int(y + h * (1 + pad)) + 1)
+        seed_h, seed_w = self._seed.shape
+        if x1 - x0 >= seed_w and y1 - y0 >= seed_h:
+            result = cv2.matchTemplate(
+                _gray(frame[y0:y1, x0:x1]), self._seed, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(result)
+            if score >= _REDETECT_MIN_SCORE:
+                window = (x0 + loc[0], y0 + loc[1], seed_w, seed_h)
+                if self.init(frame, window):
+                    return _rotate_window(window, self._raw_size, self._rotate), score
+        return None
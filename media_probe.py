@@ -0,0 +1,67 @@
+"""Video metadata that squatter needs (rotation, fps and frame count), cached on disk.
+
+Results are keyed by path, size and modification time of the video, so that opening the
+same video again (or processing it in a batch run) doesn't need to ask MediaInfo.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from pymediainfo_ import MediaInfo, STREAM_VIDEO
+
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "squatter", "media_probe")
+_PROBE_VERSION = 1
+
+_mem_cache = {}
+_mem_cache_lock = threading.Lock()
+
+def _cache_key(filename):
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    return "{}:{}:{}:{}".format(_PROBE_VERSION, path, st.st_size, st.st_mtime)
+
+def _to_float(s, default):
+    try:
+        return float(s)
+    except ValueError:
+        return default
+
+def _probe(filename):
+    values = MediaInfo.get(filename, STREAM_VIDEO, ["Rotation", "FrameRate", "FrameCount"])
+    return {
+        "rotation": int(_to_float(values["Rotation"], 0.0)),
+        "fps": _to_float(values["FrameRate"], 0.0),
+        "n_frames": int(_to_float(values["FrameCount"], 0.0)),
+    }
+
+def _write_cache(cache_path, info):
+    try:
+        if not os.path.isdir(os.path.dirname(cache_path)):
+            os.makedirs(os.path.dirname(cache_path))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(info))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        # Cache is only an optimization.
+        print("WARNING: Failed to cache media info!", e)
+
+def probe(filename, cache_dir=_CACHE_DIR):
+    """Returns {"rotation": degrees, "fps": float, "n_frames": int} for the video."""
+    key = _cache_key(filename)
+    with _mem_cache_lock:
+        info = _mem_cache.get(key)
+    if info is not None:
+        return dict(info)
+    cache_path = os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+    try:
+        with open(cache_path, "r") as f:
+            info = json.loads(f.read())
+    except (OSError, ValueError):
+        info = _probe(filename)
+        _write_cache(cache_path, info)
+    with _mem_cache_lock:
+        _mem_cache[key] = info
+    return dict(info)
@@ -0,0 +1,153 @@
+"""Motion energy of a video, from differences between heavily downscaled frames.
+
+Usage:
+    python motion_scan.py video.mp4
+
+Energy is measured a few times a second, which is enough to find stretches of footage where
+nothing moves (before the first set, rest between sets). Tracking skips those, and the app
+suggests a start frame from them. Frame index build measures it along the way (see
+video_index.py), scan() is for videos without an index. It only looks at a few frames a
+second, but still decodes all of them (grab() decodes too), so it costs as much as decoding
+the whole video.
+"""
+import sys
+
+import cv2
+import numpy as np
+
+# Energy is measured about this many times per second, on frames this wide.
+_SAMPLE_FPS = 10.0
+_SAMPLE_WIDTH = 64
+# Motion below this many times the noise floor (or below _MIN_THRESHOLD) counts as static.
+_NOISE_FACTOR = 3.0
+_MIN_THRESHOLD = 0.5
+# Percentile of energy that is taken as the noise floor of the video.
+_NOISE_PERCENTILE = 10
+# Static stretches shorter than this aren't worth skipping.
+_MIN_STATIC_SECS = 2.0
+# Tracking picks up again this long before motion starts.
+_MARGIN_SECS = 0.5
+# Lifter stands still at least this long before the first rep, after walking out. Walking
+# out takes at least _MIN_WALK_SECS of motion, anything shorter might be a rep already.
+_MIN_SETUP_SECS = 0.5
+_MIN_WALK_SECS = 3.0
+
+class MotionMeter(object):
+    """Collects motion energy while a video is read sequentially.
+
+    add() has to be called with every step-th frame, starting from the first one.
+    """
+
+    def __init__(self, fps):
+        self.step = max(1, int(round((fps or 30.0) / _SAMPLE_FPS)))
+        self._last = None
+        self._energy = []
+
+    def add(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(
+            frame, (_SAMPLE_WIDTH, max(1, h * _SAMPLE_WIDTH // w)), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (3, 3), 0).astype(np.int16)
+        if self._last is not None:
+            self._energy.append(float(np.abs(small - self._last).mean()))
+        self._last = small
+
+    def energy(self, n_frames):
+        """Returns motion energy for every frame, as array of n_frames."""
+        if not self._energy:
+            return np.zeros(n_frames, dtype=np.float32)
+        energy = np.repeat(np.asarray(self._energy, dtype=np.float32), self.step)[:n_frames]
+        return np.concatenate([
+            energy, np.full(n_frames - len(energy), energy[-1], dtype=np.float32)])
+
+def scan(video_path, stop_event=None):
+    """Returns motion energy for every frame of the video, or None if stop_event got set."""
+    cap = cv2.VideoCapture(video_path)
+    meter = MotionMeter(cap.get(cv2.CAP_PROP_FPS))
+    n_frames = 0
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if not cap.grab():
+                return meter.energy(n_frames)
+            if n_frames % meter.step == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    meter.add(frame)
+            n_frames += 1
+    finally:
+        cap.release()
+    return None
+
+def _threshold(energy):
+    return max(_MIN_THRESHOLD, _NOISE_FACTOR * float(np.percentile(energy, _NOISE_PERCENTILE)))
+
+def _runs(static):
+    """Returns [start, end) ranges where static is True."""
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], static.astype(np.int8), [0]])))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+def static_ranges(energy, fps, min_secs=_MIN_STATIC_SECS, margin_secs=_MARGIN_SECS):
+    """Returns [start, end) frame ranges where nothing moves for at least min_secs. Ranges
+    are shrunk by margin_secs on both sides, so that tracking stops after motion dies down,
+    and starts again before it picks up.
+    """
+    if len(energy) == 0: return []
+    energy = np.asarray(energy)
+    fps = fps or 30.0
+    margin = int(margin_secs * fps)
+    ranges = []
+    for start, end in _runs(energy < _threshold(energy)):
+        if end - start < min_secs * fps:
+            continue
+        start, end = start + margin, end - margin
+        if end > start:
+            ranges.append((start, end))
+    return ranges
+
+def suggest_start(energy, fps):
+    """Suggests frame to start tracking from: just before the first rep, where lifter stands
+    still after walking out, skipping any static footage at the very beginning.
+    """
+    if len(energy) == 0: return 0
+    energy = np.asarray(energy)
+    fps = fps or 30.0
+    runs = _runs(energy < _threshold(energy))
+    walked = False
+    last_end = 0
+    for start, end in runs:
+        if start - last_end >= _MIN_WALK_SECS * fps:
+            walked = True
+        last_end = end
+        if walked and end - start >= _MIN_SETUP_SECS * fps and end < len(energy):
+            return max(start, end - 1 - int(_MARGIN_SECS * fps / 2))
+    # No setup pause, start just before motion does.
+    if runs and runs[0][0] == 0 and runs[0][1] < len(energy):
+        return max(0, runs[0][1] - 1 - int(_MARGIN_SECS * fps / 2))
+    return 0
+
+def video_motion(video_path, index=None):
+    """Returns (motion energy of every frame, fps) of the video, from its VideoIndex if given,
+    otherwise the video is scanned.
+    """
+    if index is not None and index.motion is not None:
+        return index.motion, index.fps
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return scan(video_path), fps
+
+def main(argv):
+    if len(argv) != 1:
+        print("Usage: python motion_scan.py video.mp4")
+        return 1
+    energy = scan(argv[0])
+    fps = cv2.VideoCapture(argv[0]).get(cv2.CAP_PROP_FPS)
+    ranges = static_ranges(energy, fps)
+    print("Frames:", len(energy), "Suggested start frame:", suggest_start(energy, fps))
+    print("Static:", ranges, "({} frames)".format(sum(end - start for start, end in ranges)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,144 @@
+"""Finds the barbell plate in a frame, to start tracking without selecting it by hand.
+
+Usage:
+    python plate_detect.py video.mp4 [--frame 120]
+
+Circles are found with Hough transform on downscaled frames, in a few frames up to the given
+one, and vote for the plate. Confidence of the winner is the share of frames it was found
+in, times how much of its outline lies on edges. Seed box is centered on the plate, about the
+size of the collar, same as would be selected by hand.
+"""
+import argparse
+import math
+import sys
+
+import cv2
+import numpy as np
+
+import media_probe
+import video_index
+from frame_capture import VideoReader
+
+# Seeds with lower confidence than this should be checked by hand.
+MIN_CONFIDENCE = 0.5
+# Frames that vote, and how far apart they are in seconds.
+_N_VOTE_FRAMES = 5
+_VOTE_STEP_SECS = 0.1
+# Frames are downscaled to this height for detection.
+_DETECT_HEIGHT = 360
+# Plate radius range, relative to the shorter side of the frame.
+_MIN_RADIUS = 0.04
+_MAX_RADIUS = 0.3
+# Circles in different frames are the same plate, if their centers are this close (relative
+# to the radius) and radii differ by less than this factor.
+_SAME_CENTER = 0.25
+_SAME_RADIUS = 1.25
+# Seed box side relative to plate radius.
+_SEED_SIZE = 1.0
+# Points on the circle that edge support is measured at.
+_N_OUTLINE_POINTS = 64
+
+def _circles(gray):
+    """Returns list of (x, y, r) circles found in grayscale frame, best first."""
+    short = min(gray.shape[:2])
+    circles = cv2.HoughCircles(
+        gray, cv2.HOUGH_GRADIENT, dp=1.5, minDist=short * _MIN_RADIUS * 2, param1=120,
+        param2=40, minRadius=int(short * _MIN_RADIUS), maxRadius=int(short * _MAX_RADIUS))
+    if circles is None:
+        return []
+    return [tuple(float(v) for v in c) for c in circles[0]]
+
+def _edge_support(edges, circle):
+    """Share of points on the circle that are close to an edge."""
+    x, y, r = circle
+    h, w = edges.shape[:2]
+    hits = 0
+    for i in range(_N_OUTLINE_POINTS):
+        a = 2 * math.pi * i / _N_OUTLINE_POINTS
+        px, py = int(round(x + r * math.cos(a))), int(round(y + r * math.sin(a)))
+        if 0 <= px < w and 0 <= py < h and edges[py, px]:
+            hits += 1
+    return float(hits) / _N_OUTLINE_POINTS
+
+def detect_frames(frames):
+    """Returns (seed window, confidence) for the plate in frames (BGR, same size), or
+    (None, 0.0) if there is no circle in any of them. Window is in frame coordinates.
+    """
+    if not frames: return None, 0.0
+    h, w = frames[0].shape[:2]
+    scale = float(_DETECT_HEIGHT) / min(h, w)
+    # Candidates are [sum of x, y and r, number of frames found in, edge support sum].
+    candidates = []
+    for frame in frames:
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 1.5)
+        # Edges are dilated a little, Hough centers are only accurate to a pixel or two.
+        edges = cv2.dilate(cv2.Canny(gray, 60, 120), np.ones((3, 3), np.uint8))
+        found = set()
+        for circle in _circles(gray):
+            x, y, r = circle
+            for i, c in enumerate(candidates):
+                cx, cy, cr = (v / c[1] for v in c[0])
+                if (i not in found and
+                        math.hypot(x - cx, y - cy) < _SAME_CENTER * cr and
+                        1.0 / _SAME_RADIUS < r / cr < _SAME_RADIUS):
+                    c[0] = [s + v for s, v in zip(c[0], circle)]
+                    c[1] += 1
+                    c[2] += _edge_support(edges, circle)
+                    found.add(i)
+                    break
+            else:
+                candidates.append([list(circle), 1, _edge_support(edges, circle)])
+                found.add(len(candidates) - 1)
+    if not candidates: return None, 0.0
+
+    def _confidence(c):
+        return (float(c[1]) / len(frames)) * (c[2] / c[1])
+    # Plates on the bar are closest to the camera, the largest of equally good circles.
+    best = max(candidates, key=lambda c: (round(_confidence(c), 1), c[0][2] / c[1]))
+    x, y, r = (v / best[1] / scale for v in best[0])
+    side = r * _SEED_SIZE
+    return (x - side / 2, y - side / 2, side, side), _confidence(best)
+
+def detect(video_path, frame_n, index=None, rotate=None):
+    """Returns (seed window, confidence) for the plate in frame_n of the video. Window is in
+    displayed (rotated) frame coordinates, same as FrameCapture.track_start takes.
+
+    Frames that vote are the ones leading up to frame_n, where the bar is usually still.
+    """
+    if rotate is None:
+        rotate = max(media_probe.probe(video_path)["rotation"], 0) // 90
+    reader = VideoReader(
+        video_path, rotate, index.timestamps if index is not None else None)
+    try:
+        step = max(1, int(round((reader.get(cv2.CAP_PROP_FPS) or 30.0) * _VOTE_STEP_SECS)))
+        first = max(0, frame_n - step * (_N_VOTE_FRAMES - 1))
+        frames = []
+        reader.seek(first)
+        for n in range(first, frame_n + 1):
+            if (frame_n - n) % step == 0:
+                frame = reader.read()
+                if frame is None: break
+                frames.append(frame)
+            elif not reader.grab():
+                break
+    finally:
+        reader.release()
+    return detect_frames(frames)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Find barbell plate to seed tracking.")
+    parser.add_argument("video")
+    parser.add_argument("--frame", type=int, default=0)
+    args = parser.parse_args(argv)
+    window, confidence = detect(args.video, args.frame, video_index.load(args.video))
+    if window is None:
+        print("No plate found.")
+        return 1
+    print("Seed: {},{},{},{} Confidence: {:.2f}{}".format(
+        *([int(round(v)) for v in window] + [confidence,
+          "" if confidence >= MIN_CONFIDENCE else " (too low, select by hand)"])))
+    return 0 if confidence >= MIN_CONFIDENCE else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
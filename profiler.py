@@ -0,0 +1,152 @@
+"""Timing of processing stages (decode, rotate, track, resize, upload...), for finding out where
+time goes on a particular machine and configuration.
+
+Stages are timed with:
+
+    with profiler.stage("decode"):
+        ...
+
+which costs a single function call while profiling is disabled. When enabled, every stage keeps
+running totals and recent timings (for the on-screen HUD in the app), and every timed section
+is also recorded as an event that can be saved in Chrome trace format, to view in
+chrome://tracing or https://ui.perfetto.dev.
+
+Setting SQUATTER_PROFILE=trace.json enables profiling from the start, and saves the trace
+when the process exits.
+"""
+import atexit
+import collections
+import json
+import os
+import threading
+import time
+
+# Recent timings of a stage, that averages shown in the HUD are computed over.
+_RECENT = 60
+# Memory bound for recorded trace events, later events are dropped.
+_MAX_TRACE_EVENTS = 1000000
+
+_enabled = False
+_lock = threading.Lock()
+_stats = {}
+_marks = {}
+_trace = []
+_t0 = time.time()
+
+
+class _NoopStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_STAGE = _NoopStage()
+
+
+class _Stage(object):
+
+    def __init__(self, name):
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self._name, self._start, time.time())
+        return False
+
+
+def _record(name, start, end):
+    duration = end - start
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = [0, 0.0, collections.deque(maxlen=_RECENT)]
+        stat[0] += 1
+        stat[1] += duration
+        stat[2].append(duration)
+        if len(_trace) < _MAX_TRACE_EVENTS:
+            _trace.append({
+                "name": name, "ph": "X", "pid": os.getpid(),
+                "tid": threading.current_thread().ident,
+                "ts": (start - _t0) * 1e6, "dur": duration * 1e6})
+
+def enabled():
+    return _enabled
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _marks.clear()
+        del _trace[:]
+
+def stage(name):
+    """Context manager that times a stage, if profiling is enabled."""
+    if not _enabled:
+        return _NOOP_STAGE
+    return _Stage(name)
+
+def mark(name):
+    """Records an event, i.e. a displayed frame. stats() reports its rate per second."""
+    if not _enabled: return
+    now = time.time()
+    with _lock:
+        mark = _marks.get(name)
+        if mark is None:
+            mark = _marks[name] = [0, collections.deque()]
+        mark[0] += 1
+        # Only the last second is kept, for the rate.
+        times = mark[1]
+        times.append(now)
+        while now - times[0] > 1.0:
+            times.popleft()
+        if len(_trace) < _MAX_TRACE_EVENTS:
+            _trace.append({
+                "name": name, "ph": "i", "s": "t", "pid": os.getpid(),
+                "tid": threading.current_thread().ident, "ts": (now - _t0) * 1e6})
+
+def stats():
+    """Returns dict of stage name to dict with count, total_ms and recent_ms (average over
+    the last few timings), and of mark name to dict with count and rate (per second).
+    """
+    result = {}
+    with _lock:
+        for name, (count, total, recent) in _stats.items():
+            result[name] = {
+                "count": count,
+                "total_ms": total * 1000.0,
+                "recent_ms": sum(recent) * 1000.0 / len(recent),
+            }
+        now = time.time()
+        for name, (count, times) in _marks.items():
+            result[name] = {
+                "count": count,
+                "rate": float(sum(1 for t in times if now - t <= 1.0)),
+            }
+    return result
+
+def save_trace(path):
+    with _lock:
+        events = list(_trace)
+    with open(path, "w") as f:
+        f.write(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+
+def _save_trace_at_exit(path):
+    if _trace:
+        save_trace(path)
+        print("Profiling trace saved to", path)
+
+if os.environ.get("SQUATTER_PROFILE"):
+    enable()
+    atexit.register(_save_trace_at_exit, os.environ["SQUATTER_PROFILE"])
@@ -2,9 +2,59 @@ import os
 import locale
 import json
 import sys
+import threading
 import xml.etree.ElementTree as ET
 from ctypes import *
 
+# MediaInfo_stream_C and MediaInfo_info_C values from MediaInfoDLL.h
+STREAM_GENERAL = 0
+STREAM_VIDEO = 1
+_INFO_TEXT = 1
+_INFO_NAME = 0
+
+_lib = None
+_lib_lock = threading.Lock()
+
+def _get_lib():
+    """Loads MediaInfo library and declares its prototypes, only once per process."""
+    global _lib
+    with _lib_lock:
+        if _lib is not None:
+            return _lib
+        if os.name in ("nt", "dos", "os2", "ce"):
+            lib = windll.MediaInfo
+        elif sys.platform == "darwin":
+            try:
+                lib = CDLL("libmediainfo.0.dylib")
+            except OSError:
+                lib = CDLL("libmediainfo.dylib")
+        else:
+            lib = CDLL("libmediainfo.so.0")
+        # Define arguments and return types
+        lib.MediaInfo_Inform.restype = c_wchar_p
+        lib.MediaInfo_New.argtypes = []
+        lib.MediaInfo_New.restype  = c_void_p
+        lib.MediaInfo_Option.argtypes = [c_void_p, c_wchar_p, c_wchar_p]
+        lib.MediaInfo_Option.restype = c_wchar_p
+        lib.MediaInfo_Inform.argtypes = [c_void_p, c_size_t]
+        lib.MediaInfo_Inform.restype = c_wchar_p
+        lib.MediaInfo_Open.argtypes = [c_void_p, c_wchar_p]
+        lib.MediaInfo_Open.restype = c_size_t
+        lib.MediaInfo_Get.argtypes = [c_void_p, c_int, c_size_t, c_wchar_p, c_int, c_int]
+        lib.MediaInfo_Get.restype = c_wchar_p
+        lib.MediaInfo_Delete.argtypes = [c_void_p]
+        lib.MediaInfo_Delete.restype  = None
+        lib.MediaInfo_Close.argtypes = [c_void_p]
+        lib.MediaInfo_Close.restype = None
+        # Fix for https://github.com/sbraz/pymediainfo/issues/22
+        # Python 2 does not change LC_CTYPE
+        # at startup: https://bugs.python.org/issue6203
+        if (sys.version_info < (3,) and os.name == "posix"
+                and locale.getlocale() == (None, None)):
+            locale.setlocale(locale.LC_CTYPE, locale.getdefaultlocale())
+        _lib = lib
+        return _lib
+
 class Track(object):
     def __getattribute__(self, name):
         try:
@@ -64,42 +114,13 @@ class MediaInfo(object):
             return None
     @staticmethod
     def parse(filename):
-        if os.name in ("nt", "dos", "os2", "ce"):
-            lib = windll.MediaInfo
-        elif sys.platform == "darwin":
-            try:
-                lib = CDLL("libmediainfo.0.dylib")
-            except OSError:
-                lib = CDLL("libmediainfo.dylib")
-        else:
-            lib = CDLL("libmediainfo.so.0")
-
+        lib = _get_lib()
         # Test file is readable
         with open(filename, "rb"):
             pass
-        # Define arguments and return types
-        lib.MediaInfo_Inform.restype = c_wchar_p
-        lib.MediaInfo_New.argtypes = []
-        lib.MediaInfo_New.restype  = c_void_p
-        lib.MediaInfo_Option.argtypes = [c_void_p, c_wchar_p, c_wchar_p]
-        lib.MediaInfo_Option.restype = c_wchar_p
-        lib.MediaInfo_Inform.argtypes = [c_void_p, c_size_t]
-        lib.MediaInfo_Inform.restype = c_wchar_p
-        lib.MediaInfo_Open.argtypes = [c_void_p, c_wchar_p]
-        lib.MediaInfo_Open.restype = c_size_t
-        lib.MediaInfo_Delete.argtypes = [c_void_p]
-        lib.MediaInfo_Delete.restype  = None
-        lib.MediaInfo_Close.argtypes = [c_void_p]
-        lib.MediaInfo_Close.restype = None
         # Create a MediaInfo handle
         handle = lib.MediaInfo_New()
         lib.MediaInfo_Option(handle, "CharSet", "UTF-8")
-        # Fix for https://github.com/sbraz/pymediainfo/issues/22
-        # Python 2 does not change LC_CTYPE
-        # at startup: https://bugs.python.org/issue6203
-        if (sys.version_info < (3,) and os.name == "posix"
-                and locale.getlocale() == (None, None)):
-            locale.setlocale(locale.LC_CTYPE, locale.getdefaultlocale())
         lib.MediaInfo_Option(None, "Inform", "XML")
         lib.MediaInfo_Option(None, "Complete", "1")
         lib.MediaInfo_Open(handle, filename)
@@ -108,6 +129,28 @@ class MediaInfo(object):
         lib.MediaInfo_Close(handle)
         lib.MediaInfo_Delete(handle)
         return MediaInfo(xml)
+    @staticmethod
+    def get(filename, stream_kind, parameters, stream_number=0):
+        """Returns {parameter: value} for just the requested parameters, without a full report.
+
+        Values are strings, empty if parameter is not known for the stream.
+        """
+        lib = _get_lib()
+        # Test file is readable
+        with open(filename, "rb"):
+            pass
+        handle = lib.MediaInfo_New()
+        lib.MediaInfo_Option(handle, "CharSet", "UTF-8")
+        try:
+            lib.MediaInfo_Open(handle, filename)
+            values = {}
+            for parameter in parameters:
+                values[parameter] = lib.MediaInfo_Get(
+                    handle, stream_kind, stream_number, parameter, _INFO_TEXT, _INFO_NAME) or ""
+            lib.MediaInfo_Close(handle)
+        finally:
+            lib.MediaInfo_Delete(handle)
+        return values
     def _populate_tracks(self):
         if self.xml_dom is None:
             return
@@ -0,0 +1,137 @@
+"""Tracking of a single long video on several cores, by splitting it into chunks.
+
+Every chunk is tracked in its own process with its own capture. Chunks after the first one
+find their starting windows by matching seed patches (cut from the first frame, at seed
+windows) against their own first frame. Each chunk starts a few frames before the previous
+one ends, and track windows in the overlap have to agree for the chunks to be stitched
+together. If they don't, that chunk is tracked again, continuing from the previous chunk.
+"""
+import math
+import multiprocessing
+
+import cv2
+import numpy as np
+
+import video_index
+from frame_capture import FrameCapture
+
+# Shortest chunk worth starting a separate process for.
+_MIN_CHUNK = 300
+# Frames that neighbouring chunks both track, to check that they agree.
+_OVERLAP = 15
+# How far apart (relative to seed window size) windows can be in the overlap.
+_MAX_OVERLAP_DRIFT = 0.5
+
+def _open(filename, capture_kwargs):
+    return FrameCapture(filename, index=video_index.load(filename), **capture_kwargs)
+
+def _locate(frame, patch):
+    result = cv2.matchTemplate(frame, patch, cv2.TM_CCOEFF_NORMED)
+    _, _, _, loc = cv2.minMaxLoc(result)
+    return (loc[0], loc[1], patch.shape[1], patch.shape[0])
+
+def _track_range(filename, start, end, capture_kwargs, windows=None, patches=None):
+    """Tracks targets from frame start up to end, starting either from windows, or from
+    wherever patches are found in the start frame.
+
+    Returns (target windows, target confidences, lost), lost is True if tracker stopped
+    before reaching end.
+    """
+    cap = _open(filename, capture_kwargs)
+    try:
+        if windows is None:
+            frame = cap._cap.read_at(start)
+            if frame is None:
+                return [[] for _ in patches], [[] for _ in patches], True
+            windows = [_locate(frame, patch) for patch in patches]
+        cap.track_start_multi(windows, start)
+        while start + len(cap._track_windows) < end:
+            if cap.track_next() is None:
+                break
+        # Frames past a gap can be added all at once, past the end of the range.
+        n = end - start
+        return (
+            [windows[:n] for windows in cap._target_windows],
+            [confidences[:n] for confidences in cap._target_confidences],
+            start + len(cap._track_windows) < end)
+    finally:
+        cap.release()
+
+def _track_chunk(args):
+    filename, start, end, capture_kwargs, windows, patches = args
+    return _track_range(filename, start, end, capture_kwargs, windows=windows, patches=patches)
+
+def _consistent(target_windows, chunk_windows, offset, seeds):
+    """Checks that chunk's windows in the overlap agree with already stitched windows."""
+    for windows, c_windows, seed in zip(target_windows, chunk_windows, seeds):
+        if len(c_windows) < _OVERLAP:
+            return False
+        a = np.asarray(windows[offset:offset+_OVERLAP], dtype=np.float64)
+        b = np.asarray(c_windows[:_OVERLAP], dtype=np.float64)
+        drift = np.sqrt((((a[:, :2] + a[:, 2:]/2) - (b[:, :2] + b[:, 2:]/2)) ** 2).sum(axis=1))
+        if drift.max() > _MAX_OVERLAP_DRIFT * max(seed[2], seed[3]):
+            return False
+    return True
+
+def track_segments(filename, seeds, first_frame, jobs=None, capture_kwargs=None):
+    """Tracks targets from seed windows at first_frame, in parallel chunks.
+
+    Returns (target windows, target confidences, fps), same as sequential tracking would
+    produce.
+    """
+    capture_kwargs = capture_kwargs or {}
+    jobs = jobs or multiprocessing.cpu_count()
+    cap = _open(filename, capture_kwargs)
+    try:
+        n_frames = cap.n_frames()
+        fps = cap.fps()
+        frame = cap._cap.read_at(first_frame)
+    finally:
+        cap.release()
+    assert frame is not None, "Frame number out of Bounds!"
+    patches = [
+        frame[int(y):int(y+h), int(x):int(x+w)].copy() for x, y, w, h in seeds]
+
+    chunk = max(_MIN_CHUNK, int(math.ceil(float(n_frames - first_frame) / jobs)))
+    starts = list(range(first_frame, n_frames, chunk))
+    tasks = [(filename, first_frame, min(first_frame + chunk, n_frames), capture_kwargs,
+              seeds, None)]
+    for start in starts[1:]:
+        tasks.append((filename, start - _OVERLAP, min(start + chunk, n_frames), capture_kwargs,
+                      None, patches))
+    if len(tasks) == 1:
+        results = [_track_chunk(tasks[0])]
+    else:
+        pool = multiprocessing.Pool(processes=min(jobs, len(tasks)))
+        try:
+            results = pool.map(_track_chunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    target_windows = [list(windows) for windows in results[0][0]]
+    target_confidences = [list(confidences) for confidences in results[0][1]]
+    lost = results[0][2]
+    for start, task, (chunk_windows, chunk_confidences, chunk_lost) in zip(
+            starts[1:], tasks[1:], results[1:]):
+        if lost:
+            # Sequential tracking would have stopped here too.
+            break
+        offset = start - _OVERLAP - first_frame
+        if _consistent(target_windows, chunk_windows, offset, seeds):
+            for windows, c_windows in zip(target_windows, chunk_windows):
+                windows.extend(c_windows[_OVERLAP:])
+            for confidences, c_confidences in zip(target_confidences, chunk_confidences):
+                confidences.extend(c_confidences[_OVERLAP:])
+            lost = chunk_lost
+            continue
+        print("Chunk at frame", start, "doesn't match previous chunk, tracking it again.")
+        last_frame = first_frame + len(target_windows[0]) - 1
+        retracked, r_confidences, lost = _track_range(
+            filename, last_frame, task[2], capture_kwargs,
+            windows=[windows[-1] for windows in target_windows])
+        for windows, r_windows in zip(target_windows, retracked):
+            windows.extend(r_windows[1:])
+        for confidences, c_confidences in zip(target_confidences, r_confidences):
+            confidences.extend(c_confidences[1:])
+    return target_windows, target_confidences, fps
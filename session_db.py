@@ -0,0 +1,232 @@
+"""SQLite database of reps from all .squatter files, for querying results across videos.
+
+Usage:
+    python session_db.py index videos/ [--reindex]
+    python session_db.py reps --exercise squat --rep 1 --min-secs 1.5
+    python session_db.py sql \\
+        "SELECT exercise, COUNT(*) FROM reps JOIN files USING (path) GROUP BY 1"
+
+index scans directories for .squatter files, and extracts reps of new and modified files in
+parallel. --reindex processes all files again (i.e. after changes to rep extraction), and
+reports files whose number of reps has changed. Metrics stored for every rep are its lifting
+time in seconds (same as shown in the app), depth and bar path drift in pixels.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+
+import squatter_file
+from track_squat import extract_reps, rep_metrics
+
+DEFAULT_DB = "squatter_sessions.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    video_mtime REAL,
+    exercise TEXT NOT NULL,
+    first_frame INTEGER NOT NULL,
+    fps REAL NOT NULL,
+    n_frames INTEGER NOT NULL,
+    n_reps INTEGER NOT NULL,
+    partial INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reps (
+    path TEXT NOT NULL REFERENCES files (path) ON DELETE CASCADE,
+    rep INTEGER NOT NULL,
+    start_frame INTEGER NOT NULL,
+    bottom_frame INTEGER NOT NULL,
+    end_frame INTEGER NOT NULL,
+    secs REAL,
+    depth REAL NOT NULL,
+    drift REAL NOT NULL,
+    PRIMARY KEY (path, rep)
+);
+CREATE INDEX IF NOT EXISTS files_exercise ON files (exercise);
+CREATE INDEX IF NOT EXISTS reps_secs ON reps (secs);
+"""
+
+def connect(db_path=DEFAULT_DB):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _find_squatter_files(path):
+    if os.path.isfile(path):
+        return [os.path.abspath(path)]
+    paths = []
+    for dirpath, _, filenames in os.walk(path):
+        for fname in sorted(filenames):
+            if fname.endswith(squatter_file.SQUATTER_EXT):
+                paths.append(os.path.abspath(os.path.join(dirpath, fname)))
+    return paths
+
+def index_file(path):
+    """Extracts reps and their metrics from a single .squatter file."""
+    stat = os.stat(path)
+    result = {"path": path, "mtime": stat.st_mtime, "size": stat.st_size}
+    try:
+        data = squatter_file.load(path)
+        video_path = path[:-len(squatter_file.SQUATTER_EXT)]
+        reps = extract_reps(data.exercise, data.track_windows)
+        result.update({
+            "video_mtime":
+                os.path.getmtime(video_path) if os.path.exists(video_path) else None,
+            "exercise": data.exercise,
+            "first_frame": data.first_frame,
+            "fps": data.fps,
+            "n_frames": len(data.track_windows),
+            "partial": data.partial,
+            "reps": [
+                (rep, rep_metrics(data.exercise, data.track_windows, rep, data.fps))
+                for rep in reps],
+        })
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    return result
+
+def _store(conn, result):
+    conn.execute("DELETE FROM files WHERE path = ?", (result["path"],))
+    conn.execute(
+        "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (result["path"], result["mtime"], result["size"], result["video_mtime"],
+         result["exercise"], result["first_frame"], result["fps"], result["n_frames"],
+         len(result["reps"]), int(result["partial"]), time.time()))
+    first_frame = result["first_frame"]
+    conn.executemany(
+        "INSERT INTO reps VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(result["path"], rep_idx + 1,
+          first_frame + rep[0], first_frame + rep[1], first_frame + rep[2],
+          metrics["secs"], metrics["depth"], metrics["drift"])
+         for rep_idx, (rep, metrics) in enumerate(result["reps"])])
+
+def index(conn, paths, reindex=False, jobs=None):
+    """Indexes .squatter files found in paths. Returns list of (path, old number of reps,
+    new number of reps) for files that were indexed before, and now have different number
+    of reps, and list of files that failed.
+    """
+    files = []
+    for path in paths:
+        files.extend(_find_squatter_files(path))
+    known = dict(
+        (path, (mtime, size, n_reps))
+        for path, mtime, size, n_reps in conn.execute(
+            "SELECT path, mtime, size, n_reps FROM files"))
+    todo = []
+    for path in files:
+        stat = os.stat(path)
+        old = known.get(path)
+        if reindex or old is None or old[:2] != (stat.st_mtime, stat.st_size):
+            todo.append(path)
+
+    roots = [os.path.abspath(path) for path in paths]
+    found = set(files)
+    removed = [
+        path for path in known
+        if path not in found and any(
+            path == root or path.startswith(os.path.join(root, "")) for root in roots)]
+
+    changed = []
+    failed = []
+    if todo:
+        jobs = jobs or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes=max(1, min(jobs, len(todo))))
+        try:
+            results = pool.imap_unordered(index_file, todo, chunksize=8)
+            with conn:
+                for result in results:
+                    if "error" in result:
+                        failed.append((result["path"], result["error"]))
+                        continue
+                    old = known.get(result["path"])
+                    if old is not None and old[2] != len(result["reps"]):
+                        changed.append((result["path"], old[2], len(result["reps"])))
+                    _store(conn, result)
+        finally:
+            pool.close()
+            pool.join()
+    with conn:
+        conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+    print("Indexed {} of {} files, removed {}.".format(len(todo), len(files), len(removed)))
+    return sorted(changed), sorted(failed)
+
+def query_reps(conn, exercise=None, rep=None, min_secs=None, max_secs=None,
+               min_depth=None, max_drift=None):
+    """Returns rows of (path, exercise, rep, secs, depth, drift) for reps matching filters."""
+    filters = []
+    args = []
+    for column, op, value in [
+            ("exercise", "=", exercise), ("rep", "=", rep),
+            ("secs", ">=", min_secs), ("secs", "<=", max_secs),
+            ("depth", ">=", min_depth), ("drift", "<=", max_drift)]:
+        if value is not None:
+            filters.append("{} {} ?".format(column, op))
+            args.append(value)
+    sql = (
+        "SELECT path, exercise, rep, secs, depth, drift FROM reps JOIN files USING (path)" +
+        (" WHERE " + " AND ".join(filters) if filters else "") +
+        " ORDER BY path, rep")
+    return conn.execute(sql, args).fetchall()
+
+def _print_rows(header, rows):
+    print("\t".join(header))
+    for row in rows:
+        print("\t".join(
+            "{:.2f}".format(v) if isinstance(v, float) else str(v) for v in row))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Database of reps from .squatter files.")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    commands = parser.add_subparsers(dest="command")
+
+    index_parser = commands.add_parser("index", help="Index .squatter files.")
+    index_parser.add_argument("paths", nargs="+", help=".squatter files or directories.")
+    index_parser.add_argument("--reindex", action="store_true",
+            help="Process all files again, and report changes in rep counts.")
+    index_parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count())
+
+    reps_parser = commands.add_parser("reps", help="List reps matching filters.")
+    reps_parser.add_argument("--exercise", choices=["squat", "deadlift"])
+    reps_parser.add_argument("--rep", type=int, help="Rep number within the set, from 1.")
+    reps_parser.add_argument("--min-secs", type=float)
+    reps_parser.add_argument("--max-secs", type=float)
+    reps_parser.add_argument("--min-depth", type=float)
+    reps_parser.add_argument("--max-drift", type=float)
+
+    sql_parser = commands.add_parser("sql", help="Run SQL query over files and reps tables.")
+    sql_parser.add_argument("query")
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error("command is required")
+
+    conn = connect(args.db)
+    try:
+        if args.command == "index":
+            changed, failed = index(conn, args.paths, reindex=args.reindex, jobs=args.jobs)
+            for path, old, new in changed:
+                print("Reps changed: {} {} -> {}".format(path, old, new))
+            for path, error in failed:
+                print("FAILED", path, error)
+            return 1 if failed else 0
+        elif args.command == "reps":
+            _print_rows(
+                ["path", "exercise", "rep", "secs", "depth", "drift"],
+                query_reps(
+                    conn, args.exercise, args.rep, args.min_secs, args.max_secs,
+                    args.min_depth, args.max_drift))
+        elif args.command == "sql":
+            cursor = conn.execute(args.query)
+            _print_rows([d[0] for d in cursor.description or []], cursor.fetchall())
+        return 0
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,8 +1,11 @@
-import json
 import os
 import sys
+import threading
+import time
+
+# For startup time, that is printed once the window is shown.
+_T_START = time.time()
 
-import cv2
 from kivy.app import App
 from kivy.clock import Clock
 from kivy.core.window import Window
@@ -15,15 +18,36 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.label import Label
 from kivy.uix.popup import Popup
-from kivy.properties import ObjectProperty
-from kivy.uix.scrollview import ScrollView
+from kivy.properties import ObjectProperty, StringProperty
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recyclegridlayout import RecycleGridLayout
 from kivy.uix.slider import Slider
 from kivy.uix.relativelayout import RelativeLayout
-
-from pymediainfo_ import MediaInfo
-from track_squat import extract_reps, _sq_distance, _cm
-
-_SQUATTER_EXT=".squatter"
+from kivy.uix.widget import Widget
+
+import profiler
+
+# Modules that need numpy or cv2 are imported where they are used, so that the window shows up
+# without waiting for them. They get imported in the background as soon as the app starts.
+_PRELOAD_MODULES = [
+    "numpy", "cv2", "squatter_file", "video_index", "frame_capture", "track_squat",
+    "filmstrip", "track_worker"]
+
+def _preload_modules():
+    for name in _PRELOAD_MODULES:
+        __import__(name)
+
+# How often UI checks on the background tracking, and how often it previews latest frame.
+_TRACK_POLL_SECS = 0.1
+_TRACK_PREVIEW_SECS = 0.5
+# FrameCapture tracking options, see FrameCapture.__init__.
+_TRACK_OPTIONS = {"track_level": 0, "track_roi": None, "tracker": "medianflow"}
+# Playback speeds that speed button cycles through.
+_PLAYBACK_SPEEDS = [0.25, 0.5, 1.0, 2.0]
+# How often profiling HUD is refreshed, and stages it shows, in that order.
+_HUD_SECS = 0.5
+_HUD_STAGES = ["decode", "seek", "rotate", "track", "redetect", "resize", "upload"]
 
 class LoadDialog(FloatLayout):
     load = ObjectProperty(None)
@@ -33,126 +57,16 @@ class LoadDialog(FloatLayout):
 class ExerciseDialog(FloatLayout):
     process = ObjectProperty(None)
 
-class FrameCapture(object):
-
-    def __init__(self, filename, frame_canvas, track_first_frame=None, track_windows=None):
-        self._rotate = 0
-        # TODO(zviad): figure out how to make this work with PyInstaller.
-        media_info = MediaInfo.parse(filename)
-        for track in media_info.tracks:
-            if track.track_type.lower() != "video": continue
-            rot_degree = int(float(track.to_data().get("rotation", 0)))
-            while rot_degree >= 90:
-                rot_degree -= 90
-                self._rotate += 1
-            break
-        self._cap = cv2.VideoCapture(filename)
-        self._frame_canvas = frame_canvas
-        self._track_first_frame = track_first_frame
-        self._track_windows = track_windows
-
-    def release(self):
-        self._cap.release()
-
-    def n_frames(self):
-        return int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-    def fps(self):
-        return self._cap.get(cv2.CAP_PROP_FPS)
-
-    def _read_frame(self):
-        ret, frame = self._cap.read()
-        if not ret:
-            return None
-        for _ in range(self._rotate):
-            frame = cv2.flip(frame, 0)
-            frame = cv2.transpose(frame, 0)
-        return frame
-
-
-    def frame_for_canvas(self, frame_n):
-        self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_n)
-        self._cap.set(cv2.CAP_PROP_CONVERT_RGB, True)
-        frame = self._read_frame()
-        if frame is None: return None, None
-
-        canvas_w, canvas_h = int(self._frame_canvas.width), int(self._frame_canvas.height)
-        frame_w, frame_h = len(frame[0]), len(frame)
-        self._frame_orig_size = (frame_w, frame_h)
-        # Decide which way to resize the image, to keep aspect ratio intact.
-        if frame_w * canvas_h > frame_h * canvas_w:
-            frame_h = int(frame_h * canvas_w / frame_w)
-            frame_w = canvas_w
-            pos_x = 0
-            pos_y = (canvas_h - frame_h)/2
-        else:
-            frame_w = int(frame_w * canvas_h / frame_h)
-            frame_h = canvas_h
-            pos_x = (canvas_w - frame_w)/2
-            pos_y = 0
-        frame = cv2.resize(frame, (frame_w, frame_h))
-        self._frame_size = (frame_w, frame_h)
-        self._frame_pos = (pos_x, pos_y)
-        return (pos_x, pos_y), frame
-
-    def track_window_for_canvas(self, frame_n):
-        if (self._track_first_frame is None or
-                frame_n < self._track_first_frame or
-                frame_n >= self._track_first_frame+len(self._track_windows)):
-            return None
-        track_window = self._track_windows[frame_n-self._track_first_frame]
-        canvas_track_window = (
-            int(track_window[0] * self._frame_size[0] / self._frame_orig_size[0]),
-            int(track_window[1] * self._frame_size[1] / self._frame_orig_size[1]),
-            int(track_window[2] * self._frame_size[0] / self._frame_orig_size[0]),
-            int(track_window[3] * self._frame_size[1] / self._frame_orig_size[1]))
-
-        canvas_track_window = (
-            self._frame_pos[0] + canvas_track_window[0],
-            self._frame_pos[1] + self._frame_size[1] -
-                canvas_track_window[1] - canvas_track_window[3], # Need to flip Y axis...
-            canvas_track_window[2],
-            canvas_track_window[3])
-        return canvas_track_window
-
-    def canvas_xy_to_frame_xy(self, x, y):
-        frame_x = x - self._frame_pos[0]
-        if frame_x < 0 or frame_x >= self._frame_size[0]:
-            return None
-        frame_y = self._frame_pos[1] + self._frame_size[1] - y
-        if frame_y < 0 or frame_y >= self._frame_size[1]:
-            return None
-
-        frame_x = int(frame_x * self._frame_orig_size[0] / self._frame_size[0])
-        frame_y = int(frame_y * self._frame_orig_size[1] / self._frame_size[1])
-        return (frame_x, frame_y)
-
-    def track_start(self, x, y, w, h, frame_n):
-        self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_n)
-        self._cap.set(cv2.CAP_PROP_CONVERT_RGB, True)
-
-        frame = self._read_frame()
-        assert frame is not None, "Frame number out of Bounds!"
-
-        self._track_first_frame = frame_n
-        self._track_windows = [(x,y,w,h)]
-        self._tracker = cv2.Tracker_create("MEDIANFLOW")
-        ok = self._tracker.init(frame, self._track_windows[-1])
-        assert ok, "Failed to initialize tracker!"
-
-    def track_next(self):
-        """Should be called until returns False"""
-        frame = self._read_frame()
-        if frame is None: return None
-        ok, track_window = self._tracker.update(frame)
-        if not ok:
-            print("Tracker no longer available!", track_window)
-            return None
-        self._track_windows.append(track_window)
-        return frame
-
+class ResumeDialog(FloatLayout):
+    message = StringProperty("")
+    resume = ObjectProperty(None)
+    cancel = ObjectProperty(None)
 
+# Colors for tracked targets. First target is the barbell, that reps are extracted from.
+_TARGET_COLORS = [(1, 0, 0), (0, 0.6, 1), (1, 1, 0), (1, 0, 1), (0, 1, 1)]
 
+def _target_color(target):
+    return _TARGET_COLORS[target % len(_TARGET_COLORS)]
 
 class FrameCanvas(RelativeLayout):
 
@@ -164,144 +78,259 @@ class FrameCanvas(RelativeLayout):
         self.touch_points = []
 
         self._select_event = None
-        self._select_center_xy = None
-        self._select_radius = None
-        self._select_circle = None
+        # Selections are [center_xy, radius, circle], one for every target to track.
+        self._selections = []
+        self._active_selection = None
+        # Selection that was found automatically, until the user touches it or replaces it.
+        self._auto_selection = None
 
     def on_touch_down(self, touch):
         if not self.collide_point(*touch.pos): return False
         if self._app._cap is None: return False
         if self._app._play_pause_btn.text != "Play": return False
+        from track_squat import _sq_distance
 
         canvas_xy = (touch.pos[0]-self.pos[0], touch.pos[1]-self.pos[1])
-        if ((self._select_center_xy is None) or
-                (_sq_distance(canvas_xy, self._select_center_xy) >= self._select_radius ** 2)):
-            self._select_center_xy = canvas_xy
-            self._select_radius = 0
-            if self._select_circle is not None:
-                self.canvas.remove(self._select_circle)
-                self._select_circle = None
+        self._active_selection = None
+        for selection in self._selections:
+            if _sq_distance(canvas_xy, selection[0]) < selection[1] ** 2:
+                self._active_selection = selection
+                break
+        if self._active_selection is None and self._auto_selection is not None:
+            # Touching outside of automatic selection means it was wrong, it's replaced.
+            self._remove_selection(self._auto_selection)
+        self._auto_selection = None
+        if self._active_selection is None:
+            # Touching outside of existing selections starts selection of another target.
+            self._active_selection = [canvas_xy, 0, None]
+            self._selections.append(self._active_selection)
 
         if self._select_event is not None:
             self._select_event.cancel()
         self._select_event = Clock.schedule_interval(self._inc_selection, 0.01)
         return True
 
-    def _inc_selection(self, *args, **kwargs):
-        self._select_radius += 1
+    def _selection_frame_xy(self, selection):
+        center_xy, radius, _ = selection
         frame_xy1 = self._app._cap.canvas_xy_to_frame_xy(
-                self._select_center_xy[0] - self._select_radius,
-                self._select_center_xy[1] + self._select_radius)
+                center_xy[0] - radius, center_xy[1] + radius)
         frame_xy2 = self._app._cap.canvas_xy_to_frame_xy(
-                self._select_center_xy[0] + self._select_radius,
-                self._select_center_xy[1] - self._select_radius)
+                center_xy[0] + radius, center_xy[1] - radius)
+        return frame_xy1, frame_xy2
+
+    def _inc_selection(self, *args, **kwargs):
+        selection = self._active_selection
+        selection[1] += 1
+        frame_xy1, frame_xy2 = self._selection_frame_xy(selection)
         if frame_xy1 is None or frame_xy2 is None:
-            self._select_radius -= 1
+            selection[1] -= 1
             return
-        if self._select_circle is not None:
-            self.canvas.remove(self._select_circle)
-        self._select_circle = InstructionGroup()
-        self._select_circle.add(Color(1, 0, 0))
-        self._select_circle.add(
-                Line(circle=(self._select_center_xy) + (self._select_radius, ), width=dp(3)))
-        self.canvas.add(self._select_circle)
+        self._draw_selection(selection)
+
+    def _draw_selection(self, selection):
+        if selection[2] is not None:
+            self.canvas.remove(selection[2])
+        selection[2] = InstructionGroup()
+        selection[2].add(Color(*_target_color(self._selections.index(selection))))
+        selection[2].add(
+                Line(circle=(selection[0]) + (selection[1], ), width=dp(3)))
+        self.canvas.add(selection[2])
 
     def on_touch_up(self, touch):
         if self._select_event is not None:
             self._select_event.cancel()
             self._select_event = None
-        if self._select_center_xy is not None:
+        # Drop selections that never grew into a circle.
+        for selection in list(self._selections):
+            if selection[1] == 0 and selection is not self._active_selection:
+                self._selections.remove(selection)
+        self._active_selection = None
+        if any(selection[1] > 0 for selection in self._selections):
             self._app._process_btn.disabled = False
 
+    def add_selection(self, canvas_xy, radius, auto=False):
+        """Selects another target, same as selecting it by hand. Returns False if the circle
+        isn't inside the frame. Selection that was found automatically (auto) is replaced by
+        the next one selected by hand, unless it is touched first.
+        """
+        selection = [canvas_xy, radius, None]
+        frame_xy1, frame_xy2 = self._selection_frame_xy(selection)
+        if frame_xy1 is None or frame_xy2 is None:
+            return False
+        self._selections.append(selection)
+        self._draw_selection(selection)
+        if auto:
+            self._auto_selection = selection
+        self._app._process_btn.disabled = False
+        return True
+
+    def _remove_selection(self, selection):
+        if selection[2] is not None:
+            self.canvas.remove(selection[2])
+        self._selections.remove(selection)
+        if not any(other[1] > 0 for other in self._selections):
+            self._app._process_btn.disabled = True
+
     def clear_selection(self):
         self.on_touch_up(None)
-        if self._select_circle is not None:
-            self.canvas.remove(self._select_circle)
-            self._select_circle = None
-        self._select_center_xy = None
-        self._select_radius = None
+        for selection in self._selections:
+            if selection[2] is not None:
+                self.canvas.remove(selection[2])
+        self._selections = []
+        self._auto_selection = None
         self._app._process_btn.disabled = True
 
     def get_selection(self):
-        if self._select_center_xy is None:
+        selections = self.get_selections()
+        if not selections:
             return None
-        frame_xy1 = self._app._cap.canvas_xy_to_frame_xy(
-                self._select_center_xy[0] - self._select_radius,
-                self._select_center_xy[1] + self._select_radius)
-        frame_xy2 = self._app._cap.canvas_xy_to_frame_xy(
-                self._select_center_xy[0] + self._select_radius,
-                self._select_center_xy[1] - self._select_radius)
-        return (frame_xy1, frame_xy2)
+        return selections[0]
+
+    def get_selections(self):
+        """Returns list of (frame_xy1, frame_xy2), for every selected target."""
+        return [
+            self._selection_frame_xy(selection)
+            for selection in self._selections if selection[1] > 0]
+
+def rep_paths(exercise, target_windows, rep):
+    """Rep panel data for a rep: bar paths of every target, normalized once so that drawing
+    only has to scale them. Points are Nx2 arrays with y going up, in units of the rep's height.
+    """
+    import numpy as np
+    from track_squat import _cms
+    # Reps whose bottom is their last frame (or that have no frames before their end) still
+    # get at least one point, and the bottom is clamped to the points there are.
+    end = max(rep[2], rep[0] + 1)
+    target_cms = [_cms(windows[rep[0]:end]) for windows in target_windows]
+    all_cms = np.concatenate(target_cms)
+    mins = all_cms.min(axis=0)
+    extent = all_cms.max(axis=0) - mins
+    height = extent[1] or 1.0
+    paths = [(cms - mins) * (1.0, -1.0) / height for cms in target_cms]
+    return {
+        "exercise": exercise,
+        "paths": paths,
+        "aspect": extent[0] / height,
+        "bottom_idx": min(max(rep[1] - rep[0], 0), len(target_cms[0]) - 1),
+    }
+
+class FilmstripBar(Widget):
+    """Thumbnails along the frame slider, touching one jumps to its frame."""
+
+    def __init__(self, app, **kwargs):
+        super(FilmstripBar, self).__init__(**kwargs)
+        self._app = app
+        self._filmstrip = None
+        self._frames = None
+        self.bind(pos=self._redraw, size=self._redraw)
+
+    def set_filmstrip(self, filmstrip):
+        self._filmstrip = filmstrip
+        self._redraw()
+
+    def _redraw(self, *args, **kwargs):
+        self.canvas.clear()
+        self._frames = None
+        if self._filmstrip is None or self.width <= 0 or self.height <= 0: return
+        image, frames = self._filmstrip.strip(1)
+        if image is None: return
+        # As many thumbnails as fit without squeezing them.
+        thumb_w = image.shape[1] * self.height / image.shape[0]
+        image, frames = self._filmstrip.strip(int(self.width // thumb_w) + 1)
+        t = Texture.create(size=(image.shape[1], image.shape[0]), colorfmt="bgr")
+        t.flip_vertical()
+        t.blit_buffer(image.reshape(-1), bufferfmt="ubyte", colorfmt="bgr")
+        self._frames = frames
+        with self.canvas:
+            Color(1, 1, 1)
+            Rectangle(texture=t, pos=self.pos, size=self.size)
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos): return False
+        if self._frames is None: return False
+        i = int((touch.pos[0] - self.x) * len(self._frames) / self.width)
+        self._app.change_frame_to(self._frames[min(i, len(self._frames) - 1)])
+        return True
 
 class RepCanvas(RelativeLayout):
 
-    def __init__(self, app,  exercise, track_windows, bottom_idx, start_frame,**kwargs):
+    def __init__(self, app, **kwargs):
         super(RepCanvas, self).__init__(**kwargs)
-        assert exercise in ["squat", "deadlift"]
         self._app = app
-        self._start_frame = start_frame
-        self._exercise = exercise
-
-        self._cms = [_cm(w) for w in track_windows]
-        self._min_x = min(cm[0] for cm in self._cms)
-        self._min_y = min(cm[1] for cm in self._cms)
-        self._max_x = max(cm[0] for cm in self._cms)
-        self._max_y = max(cm[1] for cm in self._cms)
-        self._bottom_idx = bottom_idx
-        self._start_frame = start_frame
+        self._rep = None
+        self._start_frame = None
         self.bind(width=self._redraw)
         self.bind(height=self._redraw)
+
+    def set_rep(self, rep, start_frame):
+        """rep is from rep_paths."""
+        self._rep = rep
+        self._start_frame = start_frame
         self._redraw()
 
     def _redraw(self, *args, **kwargs):
-        scale = (self.height * 0.9) / (self._max_y - self._min_y)
-        x_adj = (self.width - ((self._max_x - self._min_x) * scale)) / 2
-        y_adj = (self.height - ((self._max_y - self._min_y) * scale)) / 2
-
-        def _convert_xy(xy):
-            return (
-                    (xy[0] - self._min_x) * scale + x_adj,
-                    self.height - ((xy[1] - self._min_y) * scale + y_adj))
-
-        _line_width = dp(3)
         self.canvas.clear()
+        if self._rep is None: return
+        scale = self.height * 0.9
+        offset = (
+            (self.width - self._rep["aspect"] * scale) / 2,
+            self.height - self.height * 0.05)
+
+        def _points(path):
+            return (path * scale + offset).ravel().tolist()
+
+        paths = self._rep["paths"]
+        bottom_idx = self._rep["bottom_idx"]
+        cms = paths[0]
+        _line_width = dp(3)
         with self.canvas:
+            for target, path in enumerate(paths[1:], 1):
+                Color(*_target_color(target))
+                Line(points=_points(path), width=dp(1))
             Color(1, 1, 1)
-            Line(points=(
-                _convert_xy(self._cms[0]) +
-                _convert_xy(self._cms[self._bottom_idx])), width=_line_width)
-            if self._exercise == "squat":
+            Line(points=_points(cms[[0, bottom_idx]]), width=_line_width)
+            if self._rep["exercise"] == "squat":
                 Color(1, 0, 0)
-                Line(points=[p
-                    for cm in self._cms[:self._bottom_idx]
-                    for p in _convert_xy(cm)], width=_line_width)
+                Line(points=_points(cms[:bottom_idx]), width=_line_width)
                 Color(0, 1, 0)
-                Line(points=[p
-                    for cm in self._cms[self._bottom_idx:]
-                    for p in _convert_xy(cm) ], width=_line_width)
-            elif self._exercise == "deadlift":
+                Line(points=_points(cms[bottom_idx:]), width=_line_width)
+            elif self._rep["exercise"] == "deadlift":
                 Color(0, 1, 0)
-                Line(points=[p
-                    for cm in self._cms[:self._bottom_idx]
-                    for p in _convert_xy(cm)], width=_line_width)
+                Line(points=_points(cms[:bottom_idx]), width=_line_width)
                 # Don't care about bar path going down during deadlifts.
 
     def on_touch_down(self, touch):
         if not self.collide_point(*touch.pos): return False
+        if self._start_frame is None: return False
         self._app.change_frame_to(self._start_frame)
         return True
 
-class RepStats(Label):
+class RepView(RecycleDataViewBehavior, GridLayout):
+    """Rep panel entry, reused by RecycleView for whichever reps are visible."""
 
-    def __init__(self, rep_idx, exercise, fps, track_windows, bottom_idx, **kwargs):
-        if exercise == "squat":
-            rep_secs = float(len(track_windows)-bottom_idx) / fps
-        elif exercise == "deadlift":
-            rep_secs = float(bottom_idx) / fps
-        else:
-            assert False, "Unknown Exercise!"
-        text = "Rep {}\n{:.2f}s".format(rep_idx, rep_secs)
-        super(RepStats, self).__init__(text=text, **kwargs)
+    def __init__(self, **kwargs):
+        super(RepView, self).__init__(cols=1, **kwargs)
+        self._stats = Label(halign="center", size_hint_y=None, height=dp(60))
+        self._canvas = RepCanvas(App.get_running_app(), size_hint_y=None, height=dp(200))
+        self.add_widget(self._stats)
+        self.add_widget(self._canvas)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self._stats.text = data["text"]
+        self._canvas.set_rep(data["rep"], data["start_frame"])
+
+def _rep_stats_text(rep_idx, exercise, fps, rep):
+    from track_squat import rep_secs
+    secs = rep_secs(exercise, (0, rep[1] - rep[0], rep[2] - rep[0]), fps)
+    return "Rep {}\n{:.2f}s".format(rep_idx, secs)
+
+def _rep_data(rep_idx, exercise, fps, target_windows, track_first_frame, rep):
+    """Rep panel entry for the rep_idx-th rep (counting from 1)."""
+    return {
+        "text": _rep_stats_text(rep_idx, exercise, fps, rep),
+        "rep": rep_paths(exercise, target_windows, rep),
+        "start_frame": rep[0] + track_first_frame,
+    }
 
 
 class SquatterApp(App):
@@ -312,8 +341,16 @@ class SquatterApp(App):
         self._play_pause_btn = play_pause_btn
 
         frame_canvas = FrameCanvas(self)
+        # Frame and track windows are redrawn in their own group, so that widgets on top of
+        # the frame (HUD, status) stay there.
+        self._frame_group = InstructionGroup()
+        frame_canvas.canvas.add(self._frame_group)
         frame_slider = Slider(min=0, max=0, value=0)
         frame_slider.bind(value=self.seek_video)
+        frame_slider.bind(on_touch_down=self._on_slider_touch)
+        speed_btn = Button(text='1x', size_hint_x=None, width=dp(50))
+        speed_btn.bind(on_release=self._on_speed)
+        self._speed_btn = speed_btn
         load_btn = Button(text='Load')
         load_btn.bind(on_release=self._load_video)
         process_btn = Button(text='Process', disabled=True)
@@ -322,17 +359,29 @@ class SquatterApp(App):
         btn_layout = GridLayout(cols=2, size_hint_y=None, height=dp(40))
         btn_layout.add_widget(load_btn)
         btn_layout.add_widget(process_btn)
-        slider_layout = GridLayout(cols=2, size_hint_y=None, height=dp(40))
+        slider_layout = GridLayout(cols=3, size_hint_y=None, height=dp(40))
         slider_layout.add_widget(play_pause_btn)
         slider_layout.add_widget(frame_slider)
+        slider_layout.add_widget(speed_btn)
+        filmstrip_bar = FilmstripBar(self)
+        # Spacers keep the filmstrip lined up with the slider.
+        filmstrip_layout = GridLayout(cols=3, size_hint_y=None, height=dp(48))
+        filmstrip_layout.add_widget(Widget(size_hint_x=None, width=dp(60)))
+        filmstrip_layout.add_widget(filmstrip_bar)
+        filmstrip_layout.add_widget(Widget(size_hint_x=None, width=dp(50)))
         video_layout = GridLayout(cols=1)
         video_layout.add_widget(frame_canvas)
+        video_layout.add_widget(filmstrip_layout)
         video_layout.add_widget(slider_layout)
         video_layout.add_widget(btn_layout)
 
-        rep_layout_inner = GridLayout(cols=3, size_hint_y=None)
+        # Only widgets for visible reps are created, and reused while scrolling.
+        rep_layout = RecycleView(size_hint_x=None, width=dp(200))
+        rep_layout.viewclass = RepView
+        rep_layout_inner = RecycleGridLayout(
+            cols=3, size_hint_y=None, default_size=(None, dp(260)),
+            default_size_hint=(1, None))
         rep_layout_inner.bind(minimum_height=rep_layout_inner.setter('height'))
-        rep_layout = ScrollView(size_hint_x=None, width=dp(200))
         rep_layout.add_widget(rep_layout_inner)
 
         main_layout = GridLayout(cols=2)
@@ -341,12 +390,28 @@ class SquatterApp(App):
 
         self._frame_canvas = frame_canvas
         self._frame_slider = frame_slider
+        self._filmstrip_bar = filmstrip_bar
+        self._filmstrip_builder = None
         self._btn_layout = btn_layout
         self._process_btn = process_btn
         self._cap = None
-        self._rep_layout = rep_layout_inner
+        self._rep_layout = rep_layout
         self._squatter_file = None
         self._popup = None
+        self._track_worker = None
+        self._frame_texture = None
+        self._frame_rect = None
+        self._index_thread = None
+        self._index_stop_event = None
+        self._hud = None
+        self._hud_event = None
+        self._playback = None
+        self._speed = 1.0
+        self._status = None
+        # Incremented for every video that is opened and every rep extraction, so that
+        # results of background work that is no longer needed can be dropped.
+        self._open_id = 0
+        self._reps_id = 0
 
         _keyboard = None
         def _keyboard_closed():
@@ -363,14 +428,7 @@ class SquatterApp(App):
         if self._play_pause_btn.text == "Play":
             if self._cap is None: return
             self.change_play_pause("Pause")
-            def _play(*args, **kwargs):
-                if self._play_pause_btn.text == "Pause":
-                    if self._frame_slider.value+1 >= self._frame_slider.max:
-                        self.change_play_pause("Play")
-                    else:
-                        self._frame_slider.value += 1
-                        Clock.schedule_once(_play)
-            Clock.schedule_once(_play)
+            self._start_playback()
         elif self._play_pause_btn.text == "Pause":
             self.change_play_pause("Play")
         elif self._play_pause_btn.text == "Stop":
@@ -379,6 +437,47 @@ class SquatterApp(App):
     def change_play_pause(self, new_text):
         self._play_pause_btn.text = new_text
 
+    def _start_playback(self):
+        """Plays from the current frame in real time, frames are decoded in the background and
+        shown when they are due, at video fps times playback speed.
+        """
+        playback = self._cap.start_playback(int(self._frame_slider.value), self._speed)
+        self._playback = playback
+        def _play(dt):
+            if self._playback is not playback:
+                return False
+            if self._play_pause_btn.text != "Pause" or playback.done():
+                self._stop_playback()
+                self.change_play_pause("Play")
+                return False
+            frame_n = playback.next_frame()
+            if frame_n is not None:
+                self._frame_slider.value = frame_n
+            return True
+        # Runs every frame that Kivy draws.
+        Clock.schedule_interval(_play, 0)
+
+    def _stop_playback(self):
+        if self._playback is None: return
+        self._playback.stop()
+        self._playback.join()
+        self._playback = None
+
+    def _on_speed(self, instance):
+        i = _PLAYBACK_SPEEDS.index(self._speed)
+        self._speed = _PLAYBACK_SPEEDS[(i + 1) % len(_PLAYBACK_SPEEDS)]
+        self._speed_btn.text = "{:g}x".format(self._speed)
+        if self._playback is not None:
+            self._stop_playback()
+            self._start_playback()
+
+    def _on_slider_touch(self, slider, touch):
+        # Dragging the slider pauses playback.
+        if self._playback is not None and slider.collide_point(*touch.pos):
+            self._stop_playback()
+            self.change_play_pause("Play")
+        return False
+
 
     def _on_keyboard_down(self, keyboard, keycode, text, modifiers):
         slider_delta = 15
@@ -390,11 +489,46 @@ class SquatterApp(App):
         elif keycode[1] == 'right':
             self._frame_slider.value = min(
                 self._frame_slider.value + slider_delta, self._frame_slider.max)
+        elif keycode[1] == 'p':
+            self._toggle_hud()
         else:
             return False
         # TODO(zviad): Figure out how to update UI when Key is held.
         return True
 
+    def _toggle_hud(self):
+        """Shows or hides profiling overlay, profiling only runs while it is shown (or if
+        SQUATTER_PROFILE is set).
+        """
+        if self._hud is None:
+            profiler.enable()
+            self._hud = Label(
+                size_hint=(None, None), halign="left", valign="top", color=(1, 1, 0, 1))
+            self._hud.bind(texture_size=self._hud.setter("size"))
+            self._frame_canvas.add_widget(self._hud)
+            self._hud_event = Clock.schedule_interval(self._update_hud, _HUD_SECS)
+            self._update_hud(0)
+        else:
+            self._hud_event.cancel()
+            self._frame_canvas.remove_widget(self._hud)
+            self._hud = None
+            if not os.environ.get("SQUATTER_PROFILE"):
+                profiler.disable()
+
+    def _update_hud(self, dt):
+        stats = profiler.stats()
+        lines = ["{:.0f} fps".format(stats.get("frame", {}).get("rate", 0.0))]
+        for name in _HUD_STAGES:
+            if name in stats:
+                lines.append("{} {:.1f} ms".format(name, stats[name]["recent_ms"]))
+        if self._cap is not None:
+            cache = self._cap._frame_cache
+            if cache.hits + cache.misses:
+                lines.append("cache hits {:.0f}%".format(
+                    100.0 * cache.hits / (cache.hits + cache.misses)))
+        self._hud.text = "\n".join(lines)
+        self._hud.pos = (dp(5), self._frame_canvas.height - self._hud.height - dp(5))
+
     def _dismiss_popup(self):
         if self._popup is not None:
             self._popup.dismiss()
@@ -410,54 +544,184 @@ class SquatterApp(App):
         self._popup.open()
 
     def _load_video_file(self, path, filenames):
+        """Opens the video in the background, the window stays responsive and shows progress
+        until the first frame is ready.
+        """
+        self._stop_playback()
+        self.change_play_pause("Play")
+        self._stop_indexing()
+        self._stop_filmstrip()
         if self._cap:
             self._cap.release()
-        exercise = None
-        track_first_frame = None
-        track_windows = None
+            self._cap = None
+        self._rep_layout.data = []
+        self._filmstrip_bar.set_filmstrip(None)
+        self._frame_group.clear()
+        self._dismiss_popup()
         filepath = os.path.join(path, filenames[0])
-        self._squatter_file = filepath+_SQUATTER_EXT
-        if os.path.exists(self._squatter_file):
-            with open(self._squatter_file, "r") as f:
-                tracking_data = json.loads(f.read())
-                exercise = tracking_data["exercise"]
-                track_first_frame = tracking_data["first_frame"]
-                track_windows = tracking_data["track_windows"]
-        self._cap = FrameCapture(
-            filepath, self._frame_canvas,
-            track_first_frame=track_first_frame, track_windows=track_windows)
-        self._cap._exercise = exercise
+        self._open_id += 1
+        open_id = self._open_id
+        t_open = time.time()
+        self._show_status("Opening {}...".format(filenames[0]))
+
+        def _status(text):
+            Clock.schedule_once(
+                lambda dt: self._open_id == open_id and self._show_status(text))
+        def _open():
+            try:
+                import squatter_file
+                import video_index
+                from frame_capture import FrameCapture
+                _status("Loading tracking results...")
+                tracking_data = squatter_file.load(squatter_file.squatter_path(filepath))
+                _status("Reading video info...")
+                index = video_index.load(filepath)
+                kwargs = {}
+                if tracking_data is not None:
+                    kwargs = {
+                        "track_first_frame": tracking_data.first_frame,
+                        "track_windows": tracking_data.track_windows,
+                        "target_windows": tracking_data.target_windows,
+                        "target_confidences": tracking_data.target_confidences,
+                    }
+                cap = FrameCapture(filepath, self._frame_canvas, index=index, **kwargs)
+                cap._exercise = tracking_data.exercise if tracking_data is not None else None
+            except Exception as e:
+                print("WARNING: Failed to open", filepath, e)
+                _status("Failed to open {}".format(filenames[0]))
+                return
+            Clock.schedule_once(
+                lambda dt: self._video_opened(open_id, cap, index, tracking_data, t_open))
+        t = threading.Thread(target=_open)
+        t.daemon = True
+        t.start()
+
+    def _video_opened(self, open_id, cap, index, tracking_data, t_open):
+        if open_id != self._open_id:
+            cap.release()
+            return
+        self._cap = cap
+        import squatter_file
+        self._squatter_file = squatter_file.squatter_path(cap._filename)
+        self._hide_status()
+        if index is None:
+            self._start_indexing(cap)
+        self._frame_slider.max = cap.n_frames()-1
+        self.change_frame_to(cap._track_first_frame or 0)
+        self.seek_video(None, None)
+        print("First frame in {:.2f}s".format(time.time() - t_open))
+        self._suggest_start()
+        self._detect_plate()
+        self._start_filmstrip(cap, index)
         self._process_tracking_info()
+        if tracking_data is not None and tracking_data.partial:
+            self._offer_resume(tracking_data)
+
+    def _show_status(self, text):
+        """Shows progress of background work over the bottom of the frame."""
+        if self._status is None:
+            self._status = Label(size_hint=(None, None))
+            self._status.bind(texture_size=self._status.setter("size"))
+            self._frame_canvas.add_widget(self._status)
+        self._status.text = text
+        self._status.pos = (dp(5), dp(5))
+
+    def _hide_status(self):
+        if self._status is None: return
+        self._frame_canvas.remove_widget(self._status)
+        self._status = None
+
+    def _offer_resume(self, tracking_data):
+        last_frame = tracking_data.first_frame + len(tracking_data.track_windows) - 1
+        def _resume():
+            self._dismiss_popup()
+            self._resume_tracking(tracking_data)
+        content = ResumeDialog(
+            message="Processing was interrupted at frame {}.".format(last_frame),
+            resume=_resume, cancel=self._dismiss_popup)
+        self._popup = Popup(
+                title="Resume Processing", content=content,
+                size_hint=(None, None), size=(dp(240), dp(200)))
+        self._popup.open()
 
-        self.change_frame_to(track_first_frame or 0)
-        self._frame_slider.max = self._cap.n_frames()-1
-        self.seek_video(None, None)
-        self._dismiss_popup()
+    def _start_indexing(self, cap):
+        """Builds frame index and proxy in the background, first load of a video only."""
+        stop_event = threading.Event()
+        def _apply_index(index):
+            if self._cap is not cap or index is None: return
+            cap.set_index(index)
+            self.seek_video(None, None)
+            self._suggest_start()
+            self._detect_plate()
+            self._start_filmstrip(cap, index)
+        def _build():
+            import video_index
+            index = video_index.build(cap._filename, cap.rotate(), stop_event=stop_event)
+            Clock.schedule_once(lambda dt: _apply_index(index))
+        self._index_stop_event = stop_event
+        self._index_thread = threading.Thread(target=_build)
+        self._index_thread.daemon = True
+        self._index_thread.start()
+
+    def _start_filmstrip(self, cap, index):
+        """Shows filmstrip of the video, building it in the background if it isn't cached."""
+        import filmstrip
+        strip = filmstrip.load(cap._filename)
+        self._filmstrip_bar.set_filmstrip(strip)
+        if strip is not None: return
+        # While frame index is being built it decodes the whole video, thumbnails are built
+        # once it is done, from its proxy if there is one.
+        if index is None and self._index_thread is not None: return
+        def _update(strip):
+            Clock.schedule_once(
+                lambda dt: self._cap is cap and self._filmstrip_bar.set_filmstrip(strip))
+        def _busy():
+            return self._playback is not None or self._track_worker is not None
+        self._filmstrip_builder = filmstrip.FilmstripBuilder(
+            cap._filename, cap.rotate(), cap.n_frames(), _update, index=index, busy=_busy)
+        self._filmstrip_builder.start()
+
+    def _stop_filmstrip(self):
+        if self._filmstrip_builder is None: return
+        self._filmstrip_builder.stop()
+        self._filmstrip_builder.join()
+        self._filmstrip_builder = None
+
+    def _stop_indexing(self):
+        if self._index_thread is None: return
+        self._index_stop_event.set()
+        self._index_thread.join()
+        self._index_thread = None
 
     def _process_tracking_info(self):
-        self._rep_layout.clear_widgets()
-        track_first_frame, track_windows = self._cap._track_first_frame, self._cap._track_windows
+        """Extracts reps and fills in the rep panel, in the background."""
+        self._rep_layout.data = []
+        self._reps_id += 1
+        reps_id = self._reps_id
+        cap = self._cap
+        track_first_frame = cap._track_first_frame
         if track_first_frame is None: return
-
-        reps = extract_reps(self._cap._exercise, track_windows)
-        print ("TrackingInfo:", track_first_frame,
-                "Reps (", self._cap._exercise, "):", reps)
-
-        for rep_idx, rep in enumerate(reps):
-            l = GridLayout(cols=1, size_hint_y=None, height=dp(260))
-            rep_windows = track_windows[rep[0]:rep[2]]
-            bottom_idx = rep[1]-rep[0]
-            l.add_widget(
-                RepStats(
-                    rep_idx+1, self._cap._exercise, self._cap.fps(),
-                    rep_windows, bottom_idx,
-                    halign="center", size_hint_y=None, height=dp(60)))
-            l.add_widget(
-                RepCanvas(
-                    self, self._cap._exercise,
-                    rep_windows, bottom_idx, rep[0] + track_first_frame,
-                    size_hint_y=None, height=dp(200)))
-            self._rep_layout.add_widget(l)
+        exercise = cap._exercise
+        target_windows = cap._target_windows
+        fps = cap.fps()
+        self._show_status("Finding reps...")
+
+        def _show(data):
+            if reps_id != self._reps_id: return
+            self._rep_layout.data = data
+            self._hide_status()
+        def _extract():
+            from track_squat import extract_reps
+            reps = extract_reps(exercise, target_windows[0])
+            print ("TrackingInfo:", track_first_frame,
+                    "Reps (", exercise, "):", reps)
+            data = [
+                _rep_data(rep_idx+1, exercise, fps, target_windows, track_first_frame, rep)
+                for rep_idx, rep in enumerate(reps)]
+            Clock.schedule_once(lambda dt: _show(data))
+        t = threading.Thread(target=_extract)
+        t.daemon = True
+        t.start()
 
     def _process_video(self, instance):
         content = ExerciseDialog(process=self._process_exercise)
@@ -467,37 +731,142 @@ class SquatterApp(App):
         self._popup.open()
 
     def _process_exercise(self, exercise):
+        from track_worker import TrackWorker
         self._dismiss_popup()
-        points = self._frame_canvas.get_selection()
-        assert points is not None
+        selections = self._frame_canvas.get_selections()
+        assert selections
 
+        self._cap._exercise = exercise
+        first_frame = int(self._frame_slider.value)
+        self._start_tracking(TrackWorker(
+                self._cap._filename, self._cap._index, self._squatter_file, exercise,
+                [(p[0][0], p[0][1], p[1][0]-p[0][0], p[1][1]-p[0][1]) for p in selections],
+                first_frame, capture_kwargs=self._track_options()))
+
+    def _track_options(self):
+        """Tracking skips footage without motion, once frame index has measured it."""
+        import motion_scan
+        index = self._cap._index
+        if index is None or index.motion is None:
+            return _TRACK_OPTIONS
+        return dict(_TRACK_OPTIONS, skip_ranges=motion_scan.static_ranges(index.motion, index.fps))
+
+    def _suggest_start(self):
+        """Moves to the frame motion scan suggests to start tracking from, unless tracking
+        results are shown or the frame was already picked.
+        """
+        import motion_scan
+        index = self._cap._index
+        if index is None or index.motion is None: return
+        if self._cap._track_first_frame is not None or self._frame_slider.value != 0: return
+        self.change_frame_to(motion_scan.suggest_start(index.motion, index.fps))
+
+    def _detect_plate(self):
+        """Selects the barbell plate on the current frame, if it can be found with enough
+        confidence. Otherwise it is left to be selected by hand.
+        """
+        cap = self._cap
+        if cap._track_first_frame is not None: return
+        frame_n = int(self._frame_slider.value)
+        def _select(window, confidence):
+            import plate_detect
+            if self._cap is not cap or int(self._frame_slider.value) != frame_n: return
+            if self._frame_canvas.get_selections(): return
+            print("Plate detection:", frame_n, window, "confidence", confidence)
+            if window is None or confidence < plate_detect.MIN_CONFIDENCE: return
+            # Frame isn't laid out yet while the canvas has no size.
+            if not cap.on_canvas(): return
+            # Circle is shrunk to fit into the frame, a plate at its edge sticks out of it.
+            frame_w, frame_h = cap._frame_orig_size
+            cx, cy = window[0] + window[2] / 2, window[1] + window[3] / 2
+            r = min(window[2] / 2, cx, cy, frame_w - 1 - cx, frame_h - 1 - cy)
+            if r < 1: return
+            center = cap.frame_xy_to_canvas_xy(cx, cy)
+            edge = cap.frame_xy_to_canvas_xy(cx + r, cy)
+            self._frame_canvas.add_selection(center, edge[0] - center[0], auto=True)
+        def _detect():
+            import plate_detect
+            window, confidence = plate_detect.detect(
+                cap._filename, frame_n, cap._index, cap.rotate())
+            Clock.schedule_once(lambda dt: _select(window, confidence))
+        t = threading.Thread(target=_detect)
+        t.daemon = True
+        t.start()
+
+    def _resume_tracking(self, tracking_data):
+        """Continues tracking from the last frame of partially processed video."""
+        from track_worker import TrackWorker
+        self._cap._exercise = tracking_data.exercise
+        self._start_tracking(TrackWorker(
+                self._cap._filename, self._cap._index, self._squatter_file,
+                tracking_data.exercise, [w[0] for w in tracking_data.target_windows],
+                tracking_data.first_frame, capture_kwargs=self._track_options(),
+                resume=tracking_data))
+
+    def _start_tracking(self, worker):
+        from track_squat import RepDetector
         self._frame_slider.disabled = True
         self._btn_layout.disabled = True
         self.change_play_pause("Stop")
-        self._cap._exercise = exercise
-        self._cap.track_start(
-                points[0][0], points[0][1],
-                points[1][0]-points[0][0], points[1][1]-points[0][1],
-                int(self._frame_slider.value))
-        def _track_it(dt):
-            f = self._cap.track_next()
-            if f is None or self._play_pause_btn.text != "Stop":
-                d = {
-                    "exercise": exercise,
-                    "first_frame": self._cap._track_first_frame,
-                    "track_windows": self._cap._track_windows}
-                with open(self._squatter_file, "w") as f:
-                    f.write(json.dumps(d, indent=4))
-
-                self._frame_slider.disabled = False
-                self._btn_layout.disabled = False
-                self._process_btn.disabled = True
-                self._process_tracking_info()
-                self.change_play_pause("Play")
-                return
-            self._frame_slider.value += 1
-            Clock.schedule_once(_track_it)
-        Clock.schedule_once(_track_it)
+        self._track_worker = worker
+        first_frame = worker.first_frame()
+        self._cap._track_first_frame = first_frame
+        self._cap._target_windows = self._track_worker.target_windows()
+        self._cap._target_confidences = self._track_worker.target_confidences()
+        self._cap._track_windows = self._cap._target_windows[0]
+        self._track_worker.start()
+        n_frames = max(self._cap.n_frames() - first_frame, 1)
+        last_preview = [time.time()]
+        # Reps are added to the panel as soon as they are found, results of earlier
+        # extraction are dropped.
+        self._reps_id += 1
+        self._rep_layout.data = []
+        self._hide_status()
+        exercise = self._cap._exercise
+        fps = self._cap.fps()
+        detector = RepDetector(exercise)
+        n_fed = [0]
+        def _add_reps(reps):
+            if not reps: return
+            data = list(self._rep_layout.data)
+            for rep in reps:
+                data.append(_rep_data(
+                    len(data)+1, exercise, fps, self._cap._target_windows, first_frame, rep))
+            self._rep_layout.data = data
+        def _poll_tracking(dt):
+            worker = self._track_worker
+            frame_n, _ = worker.progress()
+            self._cap._target_windows = worker.target_windows()
+            self._cap._target_confidences = worker.target_confidences()
+            self._cap._track_windows = self._cap._target_windows[0]
+            n_tracked = len(self._cap._track_windows)
+            _add_reps(detector.extend(self._cap._track_windows[n_fed[0]:n_tracked]))
+            n_fed[0] = n_tracked
+            if worker.is_alive() and self._play_pause_btn.text == "Stop":
+                self._process_btn.text = "Processing {}%".format(
+                    min(100, 100 * (frame_n - first_frame) // n_frames))
+                if time.time() - last_preview[0] >= _TRACK_PREVIEW_SECS:
+                    last_preview[0] = time.time()
+                    self.change_frame_to(frame_n)
+                return True
+
+            worker.stop()
+            worker.join()
+            self._track_worker = None
+
+            self._process_btn.text = "Process"
+            self._frame_slider.disabled = False
+            self._btn_layout.disabled = False
+            self._process_btn.disabled = True
+            # Worker could have tracked a few more frames before it stopped.
+            _add_reps(detector.extend(self._cap._track_windows[n_fed[0]:]))
+            _add_reps(detector.finish())
+            print ("TrackingInfo:", first_frame,
+                    "Reps (", exercise, "):", detector.reps)
+            self.change_frame_to(frame_n)
+            self.change_play_pause("Play")
+            return False
+        Clock.schedule_interval(_poll_tracking, _TRACK_POLL_SECS)
 
     def change_frame_to(self, frame_n):
         self._frame_slider.value = frame_n
@@ -507,29 +876,59 @@ class SquatterApp(App):
         self._frame_canvas.clear_selection()
         if self._frame_canvas.width == 0 or self._frame_canvas.height == 0:
             return
-        frame_pos, frame = self._cap.frame_for_canvas(int(self._frame_slider.value))
+        # Playback decodes frames ahead by itself, read ahead would only compete with it.
+        frame_pos, frame = self._cap.frame_for_canvas(
+            int(self._frame_slider.value), read_ahead=self._playback is None)
         if frame is None:
             print ("WARNING: Failed to fetch a frame properly!", int(self._frame_slider.value))
             return
-        # Frame needs to flipped because Kivy coordinates are bottom up.
-        frame = cv2.flip(frame, 0)
         frame_size = (len(frame[0]), len(frame))
-        t = Texture.create(size=frame_size, colorfmt="bgr")
-        t.blit_buffer(frame.tostring(), bufferfmt="ubyte", colorfmt="bgr")
-
-
-        self._frame_canvas.canvas.clear()
-        self._frame_canvas.canvas.add(
-                Rectangle(pos=frame_pos, texture=t, size=frame_size))
-
-        track_window = self._cap.track_window_for_canvas(int(self._frame_slider.value))
-        if track_window is not None:
-            self._frame_canvas.canvas.add(Color(1, 0, 0))
-            self._frame_canvas.canvas.add(
-                    Line(rectangle=track_window[:2] + track_window[2:], width=dp(3)))
+        t = self._frame_texture
+        if t is None or tuple(t.size) != frame_size:
+            t = Texture.create(size=frame_size, colorfmt="bgr")
+            # Frame needs to flipped because Kivy coordinates are bottom up. Flipping texture
+            # coordinates once is much cheaper than flipping every frame.
+            t.flip_vertical()
+            self._frame_texture = t
+            self._frame_rect = Rectangle(texture=t)
+        # Frames are contiguous, blit straight from the array without copying it into bytes.
+        with profiler.stage("upload"):
+            t.blit_buffer(frame.reshape(-1), bufferfmt="ubyte", colorfmt="bgr")
+        profiler.mark("frame")
+        self._frame_rect.pos = frame_pos
+        self._frame_rect.size = frame_size
+
+        self._frame_group.clear()
+        self._frame_group.add(self._frame_rect)
+
+        for target in range(self._cap.n_targets()):
+            track_window = self._cap.track_window_for_canvas(
+                int(self._frame_slider.value), target)
+            if track_window is None: continue
+            # Windows interpolated over frames where target was lost, or copied over skipped
+            # frames, are drawn thin.
+            confidence = self._cap.track_confidence(int(self._frame_slider.value), target)
+            self._frame_group.add(Color(*_target_color(target)))
+            self._frame_group.add(
+                    Line(rectangle=track_window[:2] + track_window[2:],
+                         width=dp(1) if confidence <= 0.0 else dp(3)))
         self._frame_canvas.canvas.ask_update()
 
+    def on_stop(self):
+        self._stop_playback()
+        self._stop_indexing()
+        self._stop_filmstrip()
+        if self._track_worker is not None:
+            self._track_worker.stop()
+            self._track_worker.join()
+
     def on_start(self):
+        t = threading.Thread(target=_preload_modules)
+        t.daemon = True
+        t.start()
+        # Called once the first frame of the window has been drawn.
+        Clock.schedule_once(
+            lambda dt: print("Window shown in {:.2f}s".format(time.time() - _T_START)))
         if len(sys.argv) > 1:
             fname = os.path.realpath(sys.argv[1])
             print ("Loading file", fname)
@@ -537,6 +936,7 @@ class SquatterApp(App):
 
 Factory.register('LoadDialog', cls=LoadDialog)
 Factory.register('ExerciseDialog', cls=ExerciseDialog)
+Factory.register('ResumeDialog', cls=ResumeDialog)
 
 if __name__ == '__main__':
     s = SquatterApp()
@@ -0,0 +1,311 @@
+"""Headless batch processing of squat/deadlift videos.
+
+Usage:
+    python squatter_batch.py --exercise squat --seed 410,620,40,40 --first-frame 30 videos/
+    python squatter_batch.py --manifest manifest.json
+
+Manifest is a JSON list of objects with keys: "video", "exercise", "seed" ([x, y, w, h],
+or a list of them to track several targets, reps come from the first one) and optionally
+"first_frame", "track_level", "track_roi" and "tracker". Relative video paths are resolved
+against the manifest's directory. Videos given on the command line (or found in directories)
+all use the --exercise, --seed and --first-frame flags. --seed can be repeated to track
+several targets.
+
+Seed "auto" finds the barbell plate by itself (see plate_detect.py), videos where it isn't
+found with enough confidence fail, and need a seed given by hand. First frame "auto" starts
+just before the first rep (see motion_scan.py), for videos without a frame index that costs
+an extra decoding pass over the whole video.
+
+Reps are found while a video is tracked, with --stream-reps each one is printed as soon as it
+is found (except with --segments, where reps are found once all chunks are tracked).
+
+Videos whose processing got interrupted are resumed from where it stopped, unless --force is
+given. Stretches of footage where nothing moves are skipped, unless --no-skip is given. They
+are known from the frame index built by the app (see video_index.py), videos without one are
+only scanned for them with --scan-motion, since scanning decodes the whole video once more.
+With --segments videos are processed one at a time, each split into chunks that are tracked
+in parallel, which is faster for a few long videos.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import motion_scan
+import plate_detect
+import segment_tracking
+import squatter_file
+import trackers
+import video_index
+from frame_capture import FrameCapture
+from track_squat import extract_reps, rep_secs, RepDetector
+
+_VIDEO_EXTS = (".mp4", ".mov", ".m4v", ".avi", ".mkv")
+
+def _find_videos(path):
+    if os.path.isfile(path):
+        return [path]
+    videos = []
+    for dirpath, _, filenames in os.walk(path):
+        for fname in sorted(filenames):
+            if os.path.splitext(fname)[1].lower() in _VIDEO_EXTS:
+                videos.append(os.path.join(dirpath, fname))
+    return videos
+
+def _parse_seed(s):
+    if s == "auto":
+        return s
+    seed = [int(v) for v in s.split(",")]
+    if len(seed) != 4:
+        raise argparse.ArgumentTypeError("seed must be x,y,w,h")
+    return seed
+
+def _load_manifest(path):
+    with open(path, "r") as f:
+        entries = json.loads(f.read())
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for e in entries:
+        jobs.append({
+            "video": os.path.join(base_dir, e["video"]),
+            "exercise": e["exercise"],
+            "first_frame": e.get("first_frame", 0),
+            "seeds": e["seed"] if e["seed"] == "auto" or isinstance(e["seed"][0], list)
+                else [e["seed"]],
+        })
+        for k in ("track_level", "track_roi", "tracker"):
+            if k in e:
+                jobs[-1][k] = e[k]
+    return jobs
+
+def _capture_kwargs(job):
+    return {
+        "track_level": job.get("track_level", 0),
+        "track_roi": job.get("track_roi"),
+        "tracker": job.get("tracker", trackers.DEFAULT_TRACKER),
+    }
+
+def _parse_first_frame(s):
+    return s if s == "auto" else int(s)
+
+def _resolve_auto(job, index, result, motion=None):
+    """Returns (first frame, seeds) of the job, with "auto" ones found from motion energy
+    (as returned by motion_scan.video_motion) and plate detection.
+    """
+    first_frame = job["first_frame"]
+    if first_frame == "auto":
+        energy, fps = motion or motion_scan.video_motion(job["video"], index)
+        first_frame = motion_scan.suggest_start(energy, fps)
+    seeds = job["seeds"]
+    if seeds == "auto":
+        seed, confidence = plate_detect.detect(job["video"], first_frame, index)
+        result["seed_confidence"] = confidence
+        if seed is None or confidence < plate_detect.MIN_CONFIDENCE:
+            result["needs_seed"] = True
+            raise ValueError(
+                "plate not found at frame {} (confidence {:.2f}), seed has to be given "
+                "by hand".format(first_frame, confidence))
+        seeds = [seed]
+    return first_frame, seeds
+
+def track_video_segments(job, n_jobs):
+    """Like track_video, but tracks chunks of the video in n_jobs processes."""
+    video = job["video"]
+    result = {"video": video, "exercise": job["exercise"]}
+    t_start = time.time()
+    try:
+        first_frame, seeds = _resolve_auto(job, video_index.load(video), result)
+        target_windows, target_confidences, fps = segment_tracking.track_segments(
+            video, seeds, first_frame, jobs=n_jobs, capture_kwargs=_capture_kwargs(job))
+        squatter_file.save(
+            squatter_file.squatter_path(video), job["exercise"], first_frame, fps,
+            target_windows, target_confidences)
+        result.update({
+            "first_frame": first_frame,
+            "n_tracked": len(target_windows[0]),
+            "fps": fps,
+            "reps": extract_reps(job["exercise"], target_windows[0]),
+        })
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    result["secs"] = time.time() - t_start
+    return result
+
+def _print_reps(job, first_frame, fps, reps, n_found):
+    """Prints reps found while tracking, n_found is the number found before them."""
+    for i, rep in enumerate(reps):
+        print("{} rep {}: frames {}-{} ({:.2f}s)".format(
+            job["video"], n_found + i + 1, rep[0] + first_frame, rep[2] + first_frame,
+            rep_secs(job["exercise"], rep, fps)))
+
+def track_video(job):
+    """Tracks a single video and writes its .squatter file. Returns summary for the video."""
+    video = job["video"]
+    result = {"video": video, "exercise": job["exercise"]}
+    t_start = time.time()
+    cap = None
+    writer = None
+    try:
+        index = video_index.load(video)
+        kwargs = _capture_kwargs(job)
+        resume = job.get("resume")
+        # Motion energy comes with the frame index, scanning for it costs a whole decoding
+        # pass, done only when asked for or when auto first frame needs it anyway.
+        motion = None
+        if index is not None and index.motion is not None:
+            motion = index.motion, index.fps
+        elif job.get("scan_motion") or (resume is None and job["first_frame"] == "auto"):
+            motion = motion_scan.video_motion(video, index)
+        if motion is not None and job.get("skip_static", True):
+            kwargs["skip_ranges"] = motion_scan.static_ranges(*motion)
+        if resume is None:
+            first_frame, seeds = _resolve_auto(job, index, result, motion)
+        cap = FrameCapture(video, index=index, **kwargs)
+        if resume is None:
+            cap.track_start_multi(seeds, first_frame)
+        else:
+            cap.track_resume(resume.target_windows, resume.target_confidences, resume.first_frame)
+        fps = cap.fps()
+        track_windows = cap._track_windows
+        target_windows = cap._target_windows
+        writer = squatter_file.Writer(
+            squatter_file.squatter_path(video), job["exercise"], cap._track_first_frame, fps,
+            n_targets=len(target_windows), resume=resume is not None)
+        detector = RepDetector(job["exercise"])
+        n_fed = 0
+        while True:
+            writer.extend_to(target_windows, cap._target_confidences)
+            n_found = len(detector.reps)
+            reps = detector.extend(track_windows[n_fed:])
+            n_fed = len(track_windows)
+            if job.get("stream_reps"):
+                _print_reps(job, cap._track_first_frame, fps, reps, n_found)
+            if cap.track_next() is None: break
+        writer.close()
+        writer = None
+        n_found = len(detector.reps)
+        reps = detector.finish()
+        if job.get("stream_reps"):
+            _print_reps(job, cap._track_first_frame, fps, reps, n_found)
+        reps = detector.reps
+        result.update({
+            "first_frame": cap._track_first_frame,
+            "n_tracked": len(track_windows),
+            "fps": fps,
+            "reps": reps,
+        })
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    finally:
+        if writer is not None:
+            writer.close(complete=False)
+        if cap is not None:
+            cap.release()
+    result["secs"] = time.time() - t_start
+    return result
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Process squatter videos without the GUI.")
+    parser.add_argument("paths", nargs="*", help="Video files or directories with videos.")
+    parser.add_argument("--manifest", help="JSON manifest with per video settings.")
+    parser.add_argument("--exercise", choices=["squat", "deadlift"])
+    parser.add_argument("--seed", type=_parse_seed, action="append",
+            help="Tracking seed box: x,y,w,h, or auto to find the plate. Repeat boxes to "
+                 "track several targets, auto tracks the plate only.")
+    parser.add_argument("--first-frame", type=_parse_first_frame, default=0,
+            help="Frame to start tracking from, or auto to start before the first rep "
+                 "(videos without a frame index are decoded an extra time to find it).")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--track-level", type=int, default=0,
+            help="Pyramid level to track at, each level halves the resolution.")
+    parser.add_argument("--track-roi", type=float,
+            help="Only track in region this many track window sizes around the target.")
+    parser.add_argument("--tracker", choices=trackers.tracker_names(),
+            default=trackers.DEFAULT_TRACKER)
+    parser.add_argument("--segments", action="store_true",
+            help="Split every video into chunks tracked in parallel, instead of "
+                 "processing several videos at once.")
+    parser.add_argument("--no-skip", action="store_true",
+            help="Track every frame, even where nothing moves.")
+    parser.add_argument("--scan-motion", action="store_true",
+            help="Scan videos without a frame index for footage where nothing moves, to "
+                 "skip it. Costs an extra decoding pass over the whole video.")
+    parser.add_argument("--stream-reps", action="store_true",
+            help="Print reps as soon as they are found, while videos are tracked.")
+    parser.add_argument("--force", action="store_true",
+            help="Re-process videos that already have .squatter file.")
+    parser.add_argument("--summary", default="squatter_summary.json")
+    args = parser.parse_args(argv)
+
+    jobs = []
+    if args.manifest:
+        jobs.extend(_load_manifest(args.manifest))
+    if args.paths:
+        if args.exercise is None or args.seed is None:
+            parser.error("--exercise and --seed are required for videos given as paths")
+        if "auto" in args.seed and len(args.seed) > 1:
+            parser.error("--seed auto can't be combined with other seeds")
+        for path in args.paths:
+            for video in _find_videos(path):
+                jobs.append({
+                    "video": video,
+                    "exercise": args.exercise,
+                    "first_frame": args.first_frame,
+                    "seeds": "auto" if "auto" in args.seed else args.seed,
+                })
+    for job in jobs:
+        job.setdefault("track_level", args.track_level)
+        job.setdefault("track_roi", args.track_roi)
+        job.setdefault("tracker", args.tracker)
+        job.setdefault("skip_static", not args.no_skip)
+        job.setdefault("scan_motion", args.scan_motion)
+        job.setdefault("stream_reps", args.stream_reps)
+    if not args.force:
+        todo = []
+        for job in jobs:
+            data = squatter_file.load(squatter_file.squatter_path(job["video"]))
+            if data is None:
+                todo.append(job)
+            elif data.partial:
+                # Chunks are tracked from scratch, only sequential tracking can be resumed.
+                if not args.segments:
+                    job.update({"exercise": data.exercise, "resume": data})
+                todo.append(job)
+        jobs = todo
+    if not jobs:
+        print("Nothing to process.")
+        return 0
+
+    results = []
+    def report(result):
+        if "error" in result:
+            print("FAILED", result["video"], result["error"])
+        else:
+            print("Processed", result["video"], "Reps:", len(result["reps"]),
+                  "({:.1f}s)".format(result["secs"]))
+        results.append(result)
+
+    if args.segments:
+        for job in jobs:
+            report(track_video_segments(job, args.jobs))
+    else:
+        pool = multiprocessing.Pool(processes=max(1, min(args.jobs, len(jobs))))
+        try:
+            for result in pool.imap_unordered(track_video, jobs):
+                report(result)
+        finally:
+            pool.close()
+            pool.join()
+
+    results.sort(key=lambda r: r["video"])
+    with open(args.summary, "w") as f:
+        f.write(json.dumps(results, indent=4))
+    n_failed = sum(1 for r in results if "error" in r)
+    print("Done: {} processed, {} failed. Summary: {}".format(
+        len(results) - n_failed, n_failed, args.summary))
+    return 1 if n_failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,208 @@
+"""Reading and writing of ".squatter" files, that store tracking results next to the video.
+
+File is a fixed size header, followed by one row of float32 values per tracked frame:
+
+    magic "SQTR", version, header size, exercise, first frame, fps, targets, fields per target,
+    flags
+    [x, y, w, h, confidence] * targets
+    ...
+
+Reps are extracted from the first target, others are landmarks tracked along with it.
+Confidence is 1.0 for tracked windows, lower for windows where lost target was found again
+and 0.0 for windows interpolated over frames where target was lost. Files written before
+confidence was added have 4 fields per target, and confidence of 1.0 everywhere.
+
+Rows are appended while tracking is in progress, and flushed to disk every few seconds. File
+is flagged as partial until tracking finishes, partial files can be resumed by appending more
+rows to them. Files are memory mapped for reading. Older JSON files can still be read, and
+converted with:
+
+    python squatter_file.py migrate <video.squatter>...
+"""
+import collections
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+SQUATTER_EXT = ".squatter"
+
+_MAGIC = b"SQTR"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHH16sqdHHH")
+# Flags are the last header field, files without them are never partial.
+_FLAGS = struct.Struct("<H")
+_FLAGS_OFFSET = _HEADER.size - _FLAGS.size
+_FLAG_PARTIAL = 1
+_HEADER_SIZE = 64
+_N_WINDOW_FIELDS = 4
+_N_FIELDS = 5
+# How often rows are flushed to disk while tracking is in progress.
+_CHECKPOINT_SECS = 2.0
+
+TrackingData = collections.namedtuple(
+    "TrackingData",
+    ["exercise", "first_frame", "fps", "track_windows", "target_windows", "target_confidences",
+     "partial"])
+
+def squatter_path(video_path):
+    return video_path + SQUATTER_EXT
+
+def _load_json(path):
+    with open(path, "r") as f:
+        tracking_data = json.loads(f.read())
+    return TrackingData(
+        tracking_data["exercise"],
+        tracking_data["first_frame"],
+        tracking_data.get("fps", 0.0),
+        tracking_data["track_windows"],
+        [tracking_data["track_windows"]],
+        [np.ones(len(tracking_data["track_windows"]), dtype=np.float32)],
+        False)
+
+def load(path):
+    """Returns TrackingData or None if there is no file.
+
+    For binary files track_windows is a read only, memory mapped Nx4 array for the first
+    target, and target_windows has such an array for every target. target_confidences has
+    an array of N confidences for every target. partial is True if tracking didn't finish,
+    and can be resumed with Writer(..., resume=True).
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        header = f.read(_HEADER_SIZE)
+    if not header.startswith(_MAGIC):
+        return _load_json(path)
+    magic, version, header_size, exercise, first_frame, fps, n_targets, n_fields, flags = \
+        _HEADER.unpack(header[:_HEADER.size])
+    assert version <= _VERSION, "Unsupported .squatter file version: {}".format(version)
+    row_bytes = 4 * n_targets * n_fields
+    n_rows = (os.path.getsize(path) - header_size) // row_bytes
+    exercise = exercise.rstrip(b"\0").decode("ascii")
+    if n_rows == 0:
+        rows = np.zeros((0, n_targets * n_fields), dtype=np.float32)
+    else:
+        rows = np.memmap(
+            path, dtype=np.float32, mode="r", offset=header_size,
+            shape=(n_rows, n_targets * n_fields))
+    target_windows = [
+        rows[:, t*n_fields:t*n_fields+_N_WINDOW_FIELDS] for t in range(n_targets)]
+    if n_fields > _N_WINDOW_FIELDS:
+        target_confidences = [rows[:, t*n_fields+_N_WINDOW_FIELDS] for t in range(n_targets)]
+    else:
+        target_confidences = [np.ones(n_rows, dtype=np.float32) for _ in range(n_targets)]
+    return TrackingData(
+        exercise, first_frame, fps, target_windows[0], target_windows, target_confidences,
+        bool(flags & _FLAG_PARTIAL))
+
+class Writer(object):
+    """Writes .squatter file incrementally, one frame at a time.
+
+    File stays flagged as partial until it is closed with complete=True.
+    """
+
+    def __init__(self, path, exercise, first_frame, fps, n_targets=1, resume=False):
+        """If resume is set, rows are appended to existing partial file at path instead."""
+        self._row_size = n_targets * _N_FIELDS
+        self._last_checkpoint = time.time()
+        if resume:
+            data = load(path)
+            assert data is not None and data.partial, "Nothing to resume: {}".format(path)
+            assert len(data.target_windows) == n_targets, "Number of targets doesn't match!"
+            self._n_rows = len(data.track_windows)
+            self._f = open(path, "r+b")
+            # Drop whatever part of a row was written before tracking got interrupted.
+            self._f.truncate(_HEADER_SIZE + self._n_rows * self._row_size * 4)
+            self._f.seek(0, os.SEEK_END)
+            return
+        # New file replaces the old one only once its header is written. Old file stays valid
+        # for anyone that still has it memory mapped.
+        tmp_path = path + ".tmp"
+        self._f = open(tmp_path, "wb")
+        header = _HEADER.pack(
+            _MAGIC, _VERSION, _HEADER_SIZE, exercise.encode("ascii"),
+            first_frame, fps, n_targets, _N_FIELDS, _FLAG_PARTIAL)
+        self._f.write(header.ljust(_HEADER_SIZE, b"\0"))
+        self._f.flush()
+        os.replace(tmp_path, path)
+        self._n_rows = 0
+
+    def append(self, track_windows, confidences=None):
+        """Appends windows of all targets for a single frame."""
+        self.extend(
+            [[w] for w in track_windows],
+            None if confidences is None else [[c] for c in confidences])
+
+    def extend(self, target_windows, target_confidences=None):
+        """Appends windows for several frames, given as a series of windows per target."""
+        if target_confidences is None:
+            target_confidences = [np.ones(len(w)) for w in target_windows]
+        columns = []
+        for windows, confidences in zip(target_windows, target_confidences):
+            columns.append(np.asarray(windows, dtype=np.float32).reshape(-1, _N_WINDOW_FIELDS))
+            columns.append(np.asarray(confidences, dtype=np.float32).reshape(-1, 1))
+        rows = np.concatenate(columns, axis=1)
+        assert rows.shape[1] == self._row_size
+        self._f.write(rows.tobytes())
+        self._n_rows += len(rows)
+        if time.time() - self._last_checkpoint >= _CHECKPOINT_SECS:
+            self.checkpoint()
+
+    def extend_to(self, target_windows, target_confidences):
+        """Appends frames that were added to growing series of windows, since the last write."""
+        n = self._n_rows
+        if len(target_windows[0]) > n:
+            self.extend([w[n:] for w in target_windows], [c[n:] for c in target_confidences])
+
+    def flush(self):
+        self._f.flush()
+
+    def checkpoint(self):
+        """Makes sure rows written so far survive a crash."""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._last_checkpoint = time.time()
+
+    def close(self, complete=True):
+        """complete should be False if tracking was interrupted, so that it can be resumed."""
+        if complete:
+            self._f.seek(_FLAGS_OFFSET)
+            self._f.write(_FLAGS.pack(0))
+        self._f.close()
+
+def save(path, exercise, first_frame, fps, target_windows, target_confidences=None):
+    w = Writer(path, exercise, first_frame, fps, n_targets=len(target_windows))
+    w.extend(target_windows, target_confidences)
+    w.close()
+
+def migrate(path):
+    """Converts JSON .squatter file into binary format. Returns False if there was nothing to do."""
+    with open(path, "rb") as f:
+        if f.read(len(_MAGIC)) == _MAGIC:
+            return False
+    data = _load_json(path)
+    fps = data.fps
+    video_path = path[:-len(SQUATTER_EXT)]
+    if not fps and os.path.exists(video_path):
+        import cv2
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+    save(path, data.exercise, data.first_frame, fps, data.target_windows)
+    return True
+
+def main(argv):
+    if len(argv) < 2 or argv[0] != "migrate":
+        print("Usage: python squatter_file.py migrate <file.squatter>...")
+        return 1
+    for path in argv[1:]:
+        if migrate(path):
+            print("Migrated", path)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,192 @@
+"""Renders synthetic squat/deadlift videos with known bar path, for tests and benchmarks.
+
+Usage:
+    python synth_video.py out.mp4 [--exercise squat] [--reps 3] [--size 1280x720] [--fps 30]
+                          [--rotation 90] [--noise 5] [--occlude 100:130]
+
+Video shows a plate with a collar in the middle, moving along squat or deadlift trajectory.
+Track windows of the collar are written to "out.mp4.squatter" as ground truth (that can be
+used as reference for bench_trackers.py), and ground truth reps are printed. Rotation is
+stored as metadata, with frames rotated the other way, like phones do. Writing the metadata
+needs ffmpeg.
+"""
+import argparse
+import collections
+import math
+import os
+import shutil
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+
+import squatter_file
+
+# Durations of parts of a rep in seconds, as (pause, down, turn, up). Pause is before the rep
+# (standing for squats, plates on the floor for deadlifts), turn is at the bottom of a squat
+# and at lockout of a deadlift.
+_SQUAT_PHASES = (0.6, 1.0, 0.2, 0.9)
+_DEADLIFT_PHASES = (0.8, 0.9, 0.4, 0.8)
+_TAIL_SECS = 1.0
+
+GroundTruth = collections.namedtuple(
+    "GroundTruth", ["exercise", "fps", "windows", "reps", "rep_ranges"])
+
+def _ease(t):
+    return 0.5 - 0.5 * math.cos(math.pi * t)
+
+def trajectory(exercise, n_reps, fps, size, drift=0.0):
+    """Returns (plate centers as Nx2 array, ground truth reps, rep ranges) in display
+    coordinates.
+
+    Reps are [start, turn, end] frame indices, in the same format as track_squat.extract_reps.
+    Deadlift reps end when the next pull starts, since the bar rests on the floor in between.
+    Bar doesn't move around rep boundaries, rep ranges have the (first, last) frame of that for
+    every boundary, any frame in between is a correct boundary too.
+    drift is horizontal bar path deviation in pixels, at the middle of each movement.
+    """
+    w, h = size
+    cx = w * 0.45
+    if exercise == "squat":
+        phases, top, bottom = _SQUAT_PHASES, h * 0.3, h * 0.65
+        start_y, turn_y = top, bottom
+    elif exercise == "deadlift":
+        phases, top, bottom = _DEADLIFT_PHASES, h * 0.4, h * 0.75
+        start_y, turn_y = bottom, top
+    else:
+        assert False, "Unknown Exercise!"
+    pause, down, turn, up = (max(1, int(round(secs * fps))) for secs in phases)
+
+    xs, ys, rep_ranges = [], [], []
+    def _move(n, y0, y1):
+        for i in range(n):
+            t = _ease(float(i + 1) / n)
+            xs.append(cx + drift * math.sin(math.pi * t))
+            ys.append(y0 + (y1 - y0) * t)
+    def _hold(n, y):
+        xs.extend([cx] * n)
+        ys.extend([y] * n)
+    for _ in range(n_reps):
+        _hold(pause, start_y)
+        start = (len(ys) - pause, len(ys) - 1)
+        _move(down, start_y, turn_y)
+        _hold(turn, turn_y)
+        turn_range = (len(ys) - turn - 1, len(ys) - 1)
+        _move(up, turn_y, start_y)
+        rep_ranges.append([start, turn_range, (len(ys) - 1, len(ys) - 1)])
+    _hold(int(_TAIL_SECS * fps), start_y)
+    # Rep ends anywhere the bar rests after it, until the next rep starts.
+    for rep, next_rep in zip(rep_ranges, rep_ranges[1:]):
+        rep[2] = (rep[2][0], next_rep[0][1])
+    if rep_ranges:
+        rep_ranges[-1][2] = (rep_ranges[-1][2][0], len(ys) - 1)
+
+    if exercise == "squat":
+        reps = [[s[1], t[1], e[0]] for s, t, e in rep_ranges]
+    else:
+        reps = [[s[1], t[1], e[1]] for s, t, e in rep_ranges]
+    return np.stack([xs, ys], axis=1), reps, rep_ranges
+
+def _background(size, rng):
+    w, h = size
+    bg = (rng.rand(h // 4, w // 4, 3) * 90).astype(np.uint8)
+    bg = cv2.resize(bg, (w, h), interpolation=cv2.INTER_LINEAR)
+    return cv2.GaussianBlur(bg, (5, 5), 0)
+
+def _draw_plate(frame, center, radius):
+    x, y = int(round(center[0])), int(round(center[1]))
+    cv2.circle(frame, (x, y), radius, (40, 40, 190), -1, cv2.LINE_AA)
+    cv2.circle(frame, (x, y), int(radius * 0.8), (25, 25, 140), 2, cv2.LINE_AA)
+    cv2.circle(frame, (x, y), max(2, radius // 4), (210, 210, 210), -1, cv2.LINE_AA)
+    cv2.line(frame, (x - 2 * radius, y), (x + 2 * radius, y), (160, 160, 160), 3, cv2.LINE_AA)
+
+def _add_metadata_rotation(src, dst, rotation):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is needed to write rotation metadata")
+    subprocess.check_call([
+        ffmpeg, "-y", "-v", "error", "-i", src, "-c", "copy",
+        "-metadata:s:v:0", "rotate={}".format(rotation), dst])
+
+def render(path, exercise="squat", n_reps=3, size=(640, 480), fps=30, rotation=0, noise=0.0,
+           occlusions=(), drift=0.0, seed=0):
+    """Writes synthetic video to path, returns its GroundTruth.
+
+    size is the size of displayed (rotated) frames. occlusions is a list of (start, end) frame
+    ranges where plate is covered. Ground truth windows are in displayed frame coordinates,
+    same as FrameCapture track windows.
+    """
+    assert rotation in (0, 90, 180, 270), "Rotation has to be a multiple of 90 degrees!"
+    rng = np.random.RandomState(seed)
+    centers, reps, rep_ranges = trajectory(exercise, n_reps, fps, size, drift=drift)
+    radius = int(size[1] / 12)
+    half = radius / 2.0
+    windows = [(x - half, y - half, 2 * half, 2 * half) for x, y in centers]
+
+    bg = _background(size, rng)
+    stored_size = size if rotation in (0, 180) else (size[1], size[0])
+    tmp_path = path + ".tmp" + os.path.splitext(path)[1] if rotation else path
+    writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, stored_size)
+    assert writer.isOpened(), "Failed to open video writer for {}".format(path)
+    try:
+        for i, center in enumerate(centers):
+            frame = bg.copy()
+            _draw_plate(frame, center, radius)
+            for start, end in occlusions:
+                if start <= i < end:
+                    x = int(center[0])
+                    cv2.rectangle(
+                        frame, (x - 3 * radius, 0), (x + 3 * radius, size[1]), (70, 90, 60), -1)
+            if noise:
+                frame = cv2.add(
+                    frame, rng.normal(0, noise, frame.shape).astype(np.int16), dtype=cv2.CV_8U)
+            # Frames are stored rotated counter clockwise, player rotates them back.
+            for _ in range(rotation // 90):
+                frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+            writer.write(frame)
+    finally:
+        writer.release()
+    if rotation:
+        try:
+            _add_metadata_rotation(tmp_path, path, rotation)
+        finally:
+            os.remove(tmp_path)
+    return GroundTruth(exercise, float(fps), windows, reps, rep_ranges)
+
+def _parse_size(s):
+    w, h = s.lower().split("x")
+    return (int(w), int(h))
+
+def _parse_range(s):
+    start, end = s.split(":")
+    return (int(start), int(end))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Render a synthetic squat/deadlift video.")
+    parser.add_argument("path")
+    parser.add_argument("--exercise", choices=["squat", "deadlift"], default="squat")
+    parser.add_argument("--reps", type=int, default=3)
+    parser.add_argument("--size", type=_parse_size, default=(640, 480),
+            help="Size of displayed frames: WxH.")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--rotation", type=int, default=0, choices=[0, 90, 180, 270])
+    parser.add_argument("--noise", type=float, default=0.0,
+            help="Standard deviation of per pixel noise.")
+    parser.add_argument("--occlude", type=_parse_range, action="append", default=[],
+            help="Frame range start:end where plate is covered. Can be repeated.")
+    parser.add_argument("--drift", type=float, default=0.0,
+            help="Horizontal bar path deviation in pixels.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    gt = render(
+        args.path, args.exercise, args.reps, args.size, args.fps, args.rotation, args.noise,
+        args.occlude, args.drift, args.seed)
+    squatter_file.save(
+        squatter_file.squatter_path(args.path), gt.exercise, 0, gt.fps, [gt.windows])
+    print("Frames:", len(gt.windows), "Reps:", gt.reps)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
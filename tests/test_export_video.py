@@ -0,0 +1,27 @@
+import json
+
+import cv2
+
+import export_video
+import squatter_file
+import synth_video
+
+def test_export_from_json_sidecar(tmp_path):
+    video = str(tmp_path / "squat.mp4")
+    gt = synth_video.render(video, "squat", n_reps=2, size=(320, 240), fps=30)
+    # Older JSON .squatter files don't store fps, it loads as 0.
+    with open(squatter_file.squatter_path(video), "w") as f:
+        f.write(json.dumps({
+            "exercise": "squat",
+            "first_frame": 0,
+            "track_windows": [list(w) for w in gt.windows],
+        }))
+    tracking_data = squatter_file.load(squatter_file.squatter_path(video))
+    assert tracking_data.fps == 0.0
+
+    output = str(tmp_path / "squat.annotated.mp4")
+    n_written = export_video.export(video, output)
+    assert n_written == len(gt.windows)
+    cap = cv2.VideoCapture(output)
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == n_written
+    cap.release()
@@ -0,0 +1,39 @@
+import cv2
+import numpy as np
+
+import trackers
+from frame_capture import _Target
+
+_SIZE = (640, 480)
+
+def _frame(cx, cy):
+    """Dark frame with a plate (a ring with spokes, so that it matches in one place only)."""
+    frame = np.full((_SIZE[1], _SIZE[0], 3), 40, dtype=np.uint8)
+    cv2.circle(frame, (cx, cy), 20, (220, 220, 220), -1)
+    cv2.circle(frame, (cx, cy), 8, (60, 60, 60), -1)
+    cv2.line(frame, (cx - 20, cy), (cx + 20, cy), (120, 120, 120), 3)
+    cv2.line(frame, (cx, cy - 20), (cx + 6, cy + 20), (120, 120, 120), 3)
+    return frame
+
+class _JumpingTracker(object):
+    """Tracker that reports success, with its window far away from the target."""
+
+    def update(self, image):
+        return True, (500, 400, 40, 40)
+
+def test_implausible_jump_is_lost_then_recovered():
+    target = _Target(trackers.DEFAULT_TRACKER, _SIZE, 0, 1.0, None, max_lost=90)
+    assert target.start(_frame(200, 200), (180, 180, 40, 40))
+
+    target._tracker = _JumpingTracker()
+    window, confidence = target.update(_frame(203, 204))
+    assert window is None
+    assert confidence == 0.0
+    assert not target.gave_up()
+
+    # Next frame searches for the seed patch around the last plausible window.
+    window, confidence = target.update(_frame(206, 208))
+    assert window is not None
+    assert confidence > 0.6
+    x, y, w, h = window
+    assert abs(x + w / 2 - 206) <= 2 and abs(y + h / 2 - 208) <= 2
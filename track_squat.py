@@ -1,3 +1,5 @@
+import numpy as np
+
 def _cm(track_window):
     """Center of mass for tracking window."""
     return (track_window[0] + track_window[2]/2, track_window[1] + track_window[3]/2)
@@ -5,54 +7,84 @@ def _cm(track_window):
 def _sq_distance(cm1, cm2):
     return (cm1[0]-cm2[0])**2 + (cm1[1]-cm2[1])**2
 
-def _extract_reps(track_windows,coeff=2.0):
+def _windows_array(track_windows):
+    return np.asarray(track_windows, dtype=np.float64).reshape(-1, 4)
+
+def _cms(track_windows):
+    """Centers of mass for all tracking windows, as Nx2 array."""
+    windows = _windows_array(track_windows)
+    return windows[:, 0:2] + windows[:, 2:4]/2
+
+def _sq_distances(cms, cm):
+    return (cms[:, 0]-cm[0])**2 + (cms[:, 1]-cm[1])**2
+
+def _last_nonzero(a):
+    return int(np.flatnonzero(a)[-1])
+
+# Scans below look at growing chunks of frames, so that work per rep stays proportional to
+# its length instead of the length of the whole video.
+_SCAN_CHUNK = 256
+
+def _find_first(values, start, pred):
+    """Index of first value at or after start that satisfies pred, or len(values)."""
+    chunk = _SCAN_CHUNK
+    while start < len(values):
+        found = np.flatnonzero(pred(values[start:start+chunk]))
+        if len(found): return start + int(found[0])
+        start += chunk
+        chunk *= 2
+    return len(values)
+
+def _find_armed(ys, start, min_distance):
+    """First index where ys has moved min_distance away from its minimum since start.
+
+    Returns (index, minimum) or (None, None).
+    """
+    chunk = _SCAN_CHUNK
+    while True:
+        prefix = ys[start:start+chunk]
+        min_ys = np.minimum.accumulate(prefix)
+        armed = np.flatnonzero(np.maximum.accumulate(prefix) > min_ys + min_distance)
+        if len(armed): return start + int(armed[0]), min_ys[armed[0]]
+        if start + chunk >= len(ys): return None, None
+        chunk *= 2
+
+def _extract_reps(track_windows, coeff=2.0):
+    track_windows = _windows_array(track_windows)
     reps = []
+    if len(track_windows) == 0: return reps
     min_squat_distance = coeff*track_windows[0][3]
     min_back_range = 0.5*track_windows[0][3]
-    cms = [_cm(w) for w in track_windows]
+    cms = _cms(track_windows)
+    cms_y = cms[:, 1]
 
     idx = 0
     while idx < len(cms):
-        min_cm = cms[idx]
-        min_idx = idx
-        max_cm = cms[idx]
-        max_idx = idx
-        while True:
-            if idx >= len(cms):
-                # No REP. But ran out of tracking frames.
-                break
-            cur_cm = cms[idx]
-            if cur_cm[1] >= max_cm[1]:
-                max_cm = cur_cm
-                max_idx = idx
-
-            if (max_cm[1] <= min_cm[1] + min_squat_distance) and (cur_cm[1] <= min_cm[1]):
-                min_cm = cur_cm
-                min_idx = idx
-
-            if ((max_cm[1] > min_cm[1] + min_squat_distance) and
-                (cur_cm[1] < min_cm[1] + min_back_range)):
-                # We have found bottom of the Squat, which is at max_cm.
-                # Now time to find finishing frame.
-                end_dst = _sq_distance(cur_cm, min_cm)
-                end_idx = idx
-                idx += 1
-                while idx < len(cms):
-                    cur_cm = cms[idx]
-                    if cur_cm[1] > min_cm[1] + 2*min_back_range:
-                        break
-                    cur_dst = _sq_distance(cur_cm, min_cm)
-                    if cur_dst <= end_dst:
-                        end_dst = cur_dst
-                        end_idx = idx
-                    idx += 1
-                reps.append([min_idx, max_idx, end_idx])
-                idx = end_idx
-                break
-            idx += 1
+        # Lowest point can no longer change once bar has moved far enough from it, since
+        # bar can't go back below it without completing a rep first.
+        armed_idx, min_y = _find_armed(cms_y, idx, min_squat_distance)
+        if armed_idx is None:
+            # No REP. But ran out of tracking frames.
+            break
+        back_idx = _find_first(cms_y, armed_idx, lambda ys: ys < min_y + min_back_range)
+        if back_idx == len(cms):
+            break
+        # We have found bottom of the Squat, which is at max_idx.
+        min_idx = idx + _last_nonzero(cms_y[idx:armed_idx+1] == min_y)
+        rep_ys = cms_y[idx:back_idx+1]
+        max_idx = idx + _last_nonzero(rep_ys == rep_ys.max())
+
+        # Now time to find finishing frame, closest to min_idx before bar moves away again.
+        away_idx = _find_first(
+            cms_y, back_idx+1, lambda ys: ys > min_y + 2*min_back_range)
+        dsts = _sq_distances(cms[back_idx:away_idx], cms[min_idx])
+        end_idx = away_idx - 1 - int(np.argmin(dsts[::-1]))
+        reps.append([min_idx, max_idx, end_idx])
+        idx = end_idx
     return reps
 
 def extract_squat_reps(track_windows,coeff=2.0):
+    track_windows = _windows_array(track_windows)
     reps = _extract_reps(track_windows,coeff=coeff)
     squat_reps = []
     for min_idx, max_idx, end_idx in reps:
@@ -62,7 +94,8 @@ def extract_squat_reps(track_windows,coeff=2.0):
 
 
 def extract_deadlift_reps(track_windows):
-    track_windows_reverse = [(w[0], -w[1], w[2], w[3]) for w in track_windows]
+    track_windows_reverse = np.array(_windows_array(track_windows))
+    track_windows_reverse[:, 1] *= -1
     reps = _extract_reps(track_windows_reverse, coeff=1.25)
     dead_reps = []
     for min_idx, max_idx, end_idx in reps:
@@ -77,17 +110,143 @@ def extract_reps(exercise, track_windows):
     }
     return _f[exercise](track_windows)
 
+class RepDetector(object):
+    """Finds reps while tracking is still in progress, one track window at a time.
+
+    Reps are the same as extract_reps returns for the whole track. Each one is returned as
+    soon as bar moves away after it, so that its end can no longer change, and the last one
+    by finish(). Work per window is constant, apart from going over frames after a rep's end
+    again, to look for the next rep.
+    """
+
+    def __init__(self, exercise):
+        assert exercise in ("squat", "deadlift"), "Unknown Exercise!"
+        self._exercise = exercise
+        # Deadlifts are squats upside down, see extract_deadlift_reps.
+        self._flip = exercise == "deadlift"
+        self._coeff = 2.0 if exercise == "squat" else 1.25
+        self._windows = []
+        self._cms = []
+        self.reps = []
+        self._idx = 0
+        self._next = 0
+        self._reset()
+
+    def _reset(self):
+        """Starts looking for a rep from self._idx, as _extract_reps does."""
+        self._state = "arm"
+        self._min_y = self._max_y = None
+        self._min_idx = self._max_idx = None
+        self._next = self._idx
+
+    def add(self, track_window):
+        """Adds window of the next frame, returns list of reps that it confirmed."""
+        window = tuple(float(v) for v in track_window)
+        if self._flip:
+            window = (window[0], -window[1], window[2], window[3])
+        if not self._windows:
+            self._min_distance = self._coeff * window[3]
+            self._back_range = 0.5 * window[3]
+        self._windows.append(window)
+        self._cms.append(_cm(window))
+        return self._run()
+
+    def extend(self, track_windows):
+        reps = []
+        for track_window in track_windows:
+            reps.extend(self.add(track_window))
+        return reps
+
+    def finish(self):
+        """Returns list of reps that end of the track confirmed."""
+        reps = []
+        while self._state == "away":
+            # Track ran out before bar moved away, rep ends at the closest frame found.
+            reps.append(self._confirm())
+            reps.extend(self._run())
+        return reps
+
+    def _run(self):
+        reps = []
+        while self._next < len(self._cms):
+            if self._step(self._next):
+                reps.append(self._confirm())
+            else:
+                self._next += 1
+        return reps
+
+    def _step(self, j):
+        """Processes frame j, returns True if it confirmed a rep (frame j is then not
+        processed, it's looked at again for the next one).
+        """
+        y = self._cms[j][1]
+        if self._state in ("arm", "back"):
+            # Last occurrences of the lowest and highest points since the rep started.
+            if self._max_y is None or y >= self._max_y:
+                self._max_y, self._max_idx = y, j
+        if self._state == "arm":
+            if self._min_y is None or y <= self._min_y:
+                self._min_y, self._min_idx = y, j
+            if self._max_y > self._min_y + self._min_distance:
+                self._state = "back"
+        if self._state == "back":
+            if y < self._min_y + self._back_range:
+                self._state = "away"
+                self._back_idx = j
+                self._best_dst = None
+        elif self._state == "away" and j > self._back_idx:
+            if y > self._min_y + 2 * self._back_range:
+                return True
+        if self._state == "away":
+            dst = _sq_distance(self._cms[j], self._cms[self._min_idx])
+            if self._best_dst is None or dst <= self._best_dst:
+                self._best_dst, self._end_idx = dst, j
+        return False
+
+    def _confirm(self):
+        min_idx, max_idx, end_idx = self._min_idx, self._max_idx, self._end_idx
+        if self._exercise == "squat":
+            _, ex = _trunc_rep(_windows_array(self._windows[max_idx:end_idx]), end_p=0.90)
+            rep = [min_idx, max_idx, max_idx+ex]
+        else:
+            sx, _ = _trunc_rep(
+                _windows_array(self._windows[min_idx:max_idx]), start_p=0.01, end_p=0.95)
+            rep = [min_idx+sx, max_idx, end_idx]
+        self.reps.append(rep)
+        self._idx = end_idx
+        self._reset()
+        return rep
+
+def rep_secs(exercise, rep, fps):
+    """Duration of the lifting part of the rep: ascent of a squat, or pull of a deadlift."""
+    if exercise == "squat":
+        return float(rep[2] - rep[1]) / fps
+    elif exercise == "deadlift":
+        return float(rep[1] - rep[0]) / fps
+    assert False, "Unknown Exercise!"
+
+def rep_metrics(exercise, track_windows, rep, fps):
+    """Returns dict with rep's lifting time in seconds, depth (vertical distance between start
+    and the turning point) and drift (largest horizontal distance from start) in pixels.
+    """
+    cms = _cms(_windows_array(track_windows)[rep[0]:rep[2]+1])
+    return {
+        "secs": rep_secs(exercise, rep, fps) if fps else None,
+        "depth": float(abs(cms[rep[1]-rep[0], 1] - cms[0, 1])),
+        "drift": float(np.abs(cms[:, 0] - cms[0, 0]).max()),
+    }
+
 def _trunc_rep(track_windows, start_p=0.0, end_p=1.0):
-    if not track_windows: return 0
+    if len(track_windows) == 0: return 0, 0
     assert start_p < end_p
 
-    cms = [_cm(w) for w in track_windows]
-    start_dist = _sq_distance(cms[-1], cms[0]) * start_p
-    end_dist = _sq_distance(cms[-1], cms[0]) * end_p
-    start_idx = 0
-    for idx, cm in enumerate(cms):
-        if _sq_distance(cms[0], cm) <= start_dist:
-            start_idx = idx
-        if _sq_distance(cms[0], cm) >= end_dist:
-            return start_idx, idx
-    assert False, "Unreachable Code!"
+    cms = _cms(track_windows)
+    dsts = _sq_distances(cms, cms[0])
+    start_dist = dsts[-1] * start_p
+    end_dist = dsts[-1] * end_p
+    end_idxs = np.flatnonzero(dsts >= end_dist)
+    assert len(end_idxs) > 0, "Unreachable Code!"
+    end_idx = int(end_idxs[0])
+    start_idxs = np.flatnonzero(dsts[:end_idx+1] <= start_dist)
+    start_idx = int(start_idxs[-1]) if len(start_idxs) else 0
+    return start_idx, end_idx
@@ -0,0 +1,96 @@
+import threading
+
+import squatter_file
+from frame_capture import FrameCapture
+
+class TrackWorker(threading.Thread):
+    """Tracks a video in a background thread, using its own FrameCapture.
+
+    UI thread should poll `progress()` at whatever rate it wants to show updates, instead of
+    being involved in processing of every single frame.
+    """
+
+    def __init__(self, filename, index, squatter_path, exercise, seeds, first_frame,
+                 capture_kwargs=None, resume=None):
+        """seeds are starting windows of targets to track, reps come from the first one.
+
+        resume is TrackingData of a partial .squatter file, to continue tracking from its
+        last frame instead of starting over. Tracking stays resumable if it is stopped.
+        """
+        super(TrackWorker, self).__init__()
+        self.daemon = True
+        self._filename = filename
+        self._index = index
+        self._squatter_path = squatter_path
+        self._exercise = exercise
+        self._seeds = [tuple(seed) for seed in seeds]
+        self._first_frame = first_frame
+        self._capture_kwargs = capture_kwargs or {}
+        self._stop_event = threading.Event()
+        self._resume = resume
+        if resume is None:
+            self._target_windows = [[seed] for seed in self._seeds]
+            self._target_confidences = [[1.0] for _ in self._seeds]
+        else:
+            self._target_windows = [
+                [tuple(w) for w in windows] for windows in resume.target_windows]
+            self._target_confidences = [list(c) for c in resume.target_confidences]
+        self._error = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        cap = None
+        writer = None
+        complete = False
+        try:
+            cap = FrameCapture(self._filename, index=self._index, **self._capture_kwargs)
+            if self._resume is None:
+                cap.track_start_multi(self._seeds, self._first_frame)
+            else:
+                cap.track_resume(
+                    self._resume.target_windows, self._resume.target_confidences,
+                    self._first_frame)
+            # Windows are only ever appended, thus these lists are safe to read from the UI
+            # thread while tracking is still in progress.
+            self._target_windows = cap._target_windows
+            self._target_confidences = cap._target_confidences
+            writer = squatter_file.Writer(
+                self._squatter_path, self._exercise, self._first_frame, cap.fps(),
+                n_targets=len(self._seeds), resume=self._resume is not None)
+            writer.extend_to(self._target_windows, self._target_confidences)
+            while not self._stop_event.is_set():
+                if cap.track_next() is None:
+                    complete = True
+                    break
+                writer.extend_to(self._target_windows, self._target_confidences)
+        except Exception as e:
+            print("Tracking failed!", e)
+            self._error = e
+        finally:
+            if writer is not None:
+                writer.close(complete=complete)
+            if cap is not None:
+                cap.release()
+
+    def error(self):
+        return self._error
+
+    def first_frame(self):
+        return self._first_frame
+
+    def track_windows(self):
+        return self._target_windows[0]
+
+    def target_windows(self):
+        return self._target_windows
+
+    def target_confidences(self):
+        return self._target_confidences
+
+    def progress(self):
+        """Returns (last tracked frame number, last track window of the first target)."""
+        track_windows = self._target_windows[0]
+        n_tracked = len(track_windows)
+        return self._first_frame + n_tracked - 1, track_windows[n_tracked - 1]
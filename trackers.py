@@ -0,0 +1,156 @@
+"""Tracker backends, that can be selected by name for FrameCapture.
+
+Every tracker has the same interface as OpenCV trackers:
+    init(frame, window) -> ok
+    update(frame) -> (ok, window)
+where window is (x, y, w, h).
+"""
+import cv2
+import numpy as np
+
+DEFAULT_TRACKER = "medianflow"
+
+class _OpenCVTracker(object):
+    """Wraps OpenCV trackers, which have different APIs depending on OpenCV version."""
+
+    def __init__(self, tracker, int_windows):
+        self._tracker = tracker
+        # Newer (non legacy) trackers only take integer rectangles.
+        self._int_windows = int_windows
+
+    def init(self, frame, window):
+        if self._int_windows:
+            window = tuple(int(round(v)) for v in window)
+        else:
+            window = tuple(float(v) for v in window)
+        ok = self._tracker.init(frame, window)
+        # Newer OpenCV versions don't return anything from init.
+        return ok is None or bool(ok)
+
+    def update(self, frame):
+        ok, window = self._tracker.update(frame)
+        return ok, tuple(window)
+
+def _opencv_tracker(name, old_name, prefer_legacy):
+    legacy = getattr(cv2, "legacy", None)
+    factories = []
+    if legacy is not None:
+        factories.append((getattr(legacy, "Tracker%s_create" % name, None), False))
+    factories.append((getattr(cv2, "Tracker%s_create" % name, None), legacy is not None))
+    if not prefer_legacy:
+        factories.reverse()
+    for factory, int_windows in factories:
+        if factory is not None:
+            return _OpenCVTracker(factory(), int_windows)
+    if hasattr(cv2, "Tracker_create"):
+        # OpenCV 3.2 and older.
+        return _OpenCVTracker(cv2.Tracker_create(old_name), False)
+    raise ValueError("Tracker {} is not available in this OpenCV build!".format(name))
+
+def _gray(frame):
+    if frame.ndim == 3:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+def _clip_window(window, frame):
+    """Returns integer window clipped to the frame, or None if nothing is left of it."""
+    x, y, w, h = window
+    x0, y0 = max(0, int(round(x))), max(0, int(round(y)))
+    x1 = min(frame.shape[1], int(round(x + w)))
+    y1 = min(frame.shape[0], int(round(y + h)))
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+class TemplateTracker(object):
+    """Finds seed patch again in the area around its last position, using template matching.
+
+    Template is never updated, thus it can't drift away from the target, but it won't follow
+    scale or appearance changes either.
+    """
+
+    def __init__(self, search_scale=2.0, min_score=0.5):
+        self._search_scale = search_scale
+        self._min_score = min_score
+
+    def init(self, frame, window):
+        clipped = _clip_window(window, frame)
+        if clipped is None: return False
+        x, y, w, h = clipped
+        self._template = _gray(frame)[y:y+h, x:x+w].copy()
+        self._window = tuple(float(v) for v in window)
+        return True
+
+    def update(self, frame):
+        x, y, w, h = self._window
+        th, tw = self._template.shape
+        pad_w, pad_h = tw * self._search_scale, th * self._search_scale
+        search = _clip_window((x - pad_w, y - pad_h, w + 2*pad_w, h + 2*pad_h), frame)
+        if search is None or search[2] < tw or search[3] < th:
+            return False, self._window
+        sx, sy, sw, sh = search
+        result = cv2.matchTemplate(
+            _gray(frame)[sy:sy+sh, sx:sx+sw], self._template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(result)
+        if score < self._min_score:
+            return False, self._window
+        self._window = (float(sx + loc[0]), float(sy + loc[1]), w, h)
+        return True, self._window
+
+class FlowTracker(object):
+    """Moves window by median optical flow of good features inside of it."""
+
+    def __init__(self, max_points=50, min_points=5):
+        self._max_points = max_points
+        self._min_points = min_points
+
+    def init(self, frame, window):
+        self._window = tuple(float(v) for v in window)
+        self._prev = _gray(frame)
+        return self._find_points()
+
+    def _find_points(self):
+        clipped = _clip_window(self._window, self._prev)
+        if clipped is None: return False
+        x, y, w, h = clipped
+        mask = np.zeros_like(self._prev)
+        mask[y:y+h, x:x+w] = 255
+        points = cv2.goodFeaturesToTrack(
+            self._prev, self._max_points, 0.01, 2, mask=mask)
+        if points is None or len(points) < self._min_points:
+            return False
+        self._points = points
+        return True
+
+    def update(self, frame):
+        gray = _gray(frame)
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev, gray, self._points, None)
+        good = status.reshape(-1) == 1
+        if good.sum() < self._min_points:
+            return False, self._window
+        shift = np.median(points[good] - self._points[good], axis=0).reshape(-1)
+        x, y, w, h = self._window
+        self._window = (x + float(shift[0]), y + float(shift[1]), w, h)
+        self._prev = gray
+        # Features are picked again every frame, so that they stay inside of the window.
+        if not self._find_points():
+            return False, self._window
+        return True, self._window
+
+_TRACKERS = {
+    "medianflow": lambda: _opencv_tracker("MedianFlow", "MEDIANFLOW", prefer_legacy=True),
+    "kcf": lambda: _opencv_tracker("KCF", "KCF", prefer_legacy=False),
+    "csrt": lambda: _opencv_tracker("CSRT", "CSRT", prefer_legacy=False),
+    "mosse": lambda: _opencv_tracker("MOSSE", "MOSSE", prefer_legacy=True),
+    "template": TemplateTracker,
+    "flow": FlowTracker,
+}
+
+def tracker_names():
+    return sorted(_TRACKERS.keys())
+
+def create_tracker(name=DEFAULT_TRACKER):
+    if name not in _TRACKERS:
+        raise ValueError("Unknown tracker: {}, available: {}".format(
+            name, ", ".join(tracker_names())))
+    return _TRACKERS[name]()
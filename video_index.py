@@ -0,0 +1,120 @@
+"""Per video frame timestamp index and low resolution proxy, stored next to the video.
+
+Index is built in a single decoding pass. Timestamps make seeking in the source video frame
+accurate (see VideoReader.seek), and proxy is an all-intra MJPEG video at display resolution
+that can be scrubbed without decoding from previous key frames of the source. Motion energy
+of every frame (see motion_scan.py) is measured along the way.
+"""
+import json
+import os
+
+import cv2
+
+import motion_scan
+from frame_capture import _rotate_frame
+
+INDEX_EXT = ".squatter-index"
+PROXY_EXT = ".squatter-proxy.avi"
+_INDEX_VERSION = 2
+# Proxy is only written for videos that are larger than this, on their longest side.
+_PROXY_MAX_SIDE = 960
+
+def _fingerprint(video_path):
+    st = os.stat(video_path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+class VideoIndex(object):
+
+    def __init__(self, timestamps, fps, frame_size, proxy_path=None, motion=None):
+        self.timestamps = timestamps
+        self.fps = fps
+        # Size of rotated source frames, proxy frames are scaled down from it.
+        self.frame_size = tuple(frame_size)
+        self.proxy_path = proxy_path
+        # Motion energy of every frame.
+        self.motion = motion
+
+    def n_frames(self):
+        return len(self.timestamps)
+
+def load(video_path):
+    """Returns VideoIndex for the video, or None if it is missing or out of date."""
+    index_path = video_path + INDEX_EXT
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, "r") as f:
+        d = json.loads(f.read())
+    if d.get("version") != _INDEX_VERSION or d.get("fingerprint") != _fingerprint(video_path):
+        return None
+    proxy_path = None
+    if d["proxy"] and os.path.exists(video_path + PROXY_EXT):
+        proxy_path = video_path + PROXY_EXT
+    return VideoIndex(d["timestamps"], d["fps"], d["frame_size"], proxy_path, d["motion"])
+
+def build(video_path, rotate, proxy=True, stop_event=None):
+    """Builds and saves index (and optionally the proxy) for the video.
+
+    Returns None if stop_event gets set before the whole video is processed.
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    src_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    src_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if rotate % 2 == 1:
+        src_w, src_h = src_h, src_w
+    proxy = proxy and max(src_w, src_h) > _PROXY_MAX_SIDE
+    proxy_tmp_path = video_path + PROXY_EXT + ".tmp.avi"
+    writer = None
+    if proxy:
+        scale = float(_PROXY_MAX_SIDE) / max(src_w, src_h)
+        proxy_size = (int(src_w * scale) // 2 * 2, int(src_h * scale) // 2 * 2)
+        writer = cv2.VideoWriter(
+            proxy_tmp_path, cv2.VideoWriter_fourcc(*"MJPG"), fps, proxy_size)
+
+    meter = motion_scan.MotionMeter(fps)
+    timestamps = []
+    completed = False
+    try:
+        while stop_event is None or not stop_event.is_set():
+            sample = len(timestamps) % meter.step == 0
+            if writer is None:
+                ok = cap.grab()
+                if ok and sample:
+                    ok, frame = cap.retrieve()
+            else:
+                ok, frame = cap.read()
+                if ok:
+                    frame = _rotate_frame(frame, rotate)
+                    writer.write(cv2.resize(frame, proxy_size, interpolation=cv2.INTER_AREA))
+            if ok and sample:
+                meter.add(frame)
+            if not ok:
+                completed = True
+                break
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+            if not completed:
+                os.remove(proxy_tmp_path)
+    if not completed:
+        return None
+
+    proxy_path = None
+    if writer is not None:
+        proxy_path = video_path + PROXY_EXT
+        os.rename(proxy_tmp_path, proxy_path)
+    motion = [round(float(e), 2) for e in meter.energy(len(timestamps))]
+    d = {
+        "version": _INDEX_VERSION,
+        "fingerprint": _fingerprint(video_path),
+        "fps": fps,
+        "frame_size": [src_w, src_h],
+        "proxy": proxy_path is not None,
+        "timestamps": timestamps,
+        "motion": motion,
+    }
+    with open(video_path + INDEX_EXT, "w") as f:
+        f.write(json.dumps(d))
+    return VideoIndex(timestamps, fps, (src_w, src_h), proxy_path, motion)